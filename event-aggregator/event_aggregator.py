@@ -1,9 +1,20 @@
 import json
 import boto3
+from boto3.dynamodb.conditions import Key
+from datetime import datetime, timezone, timedelta
 
 dynamodb = boto3.resource('dynamodb')
 
 summaries_table = dynamodb.Table('event-aggregator-summaries')
+rollups_table = dynamodb.Table('event-aggregator-rollups')
+
+# Tumbling windows maintained per SummaryID, and how long each window is kept
+# before DynamoDB TTL expires it
+ROLLUP_WINDOWS = {
+    'minute': {'size': timedelta(minutes=1), 'retention': timedelta(days=1)},
+    'hour': {'size': timedelta(hours=1), 'retention': timedelta(days=7)},
+    'day': {'size': timedelta(days=1), 'retention': timedelta(days=90)},
+}
 
 def lambda_handler(event, context):
     print("Received event: " + json.dumps(event, indent=2))
@@ -25,8 +36,82 @@ def lambda_handler(event, context):
 
         print(f"Updated summary for {event_message}: {response['Attributes']}")
 
+        update_rollups(event_message, get_event_time(record))
+
     return {
         'statusCode': 200,
         'body': json.dumps('Event aggregation completed successfully!')
     }
-        
\ No newline at end of file
+
+def get_event_time(record):
+    """Use the producer's Timestamp, falling back to when the stream saw the write."""
+    timestamp = record['dynamodb']['NewImage'].get('Timestamp', {}).get('S')
+    if timestamp:
+        try:
+            event_time = datetime.fromisoformat(timestamp)
+            if event_time.tzinfo is None:
+                event_time = event_time.replace(tzinfo=timezone.utc)
+            return event_time
+        except ValueError:
+            print(f"Unparseable Timestamp {timestamp}, using stream time instead")
+
+    approximate_time = record['dynamodb'].get('ApproximateCreationDateTime')
+    if approximate_time is not None:
+        return datetime.fromtimestamp(float(approximate_time), tz=timezone.utc)
+
+    return datetime.now(timezone.utc)
+
+def get_window_start(event_time, granularity):
+    """Truncate an event time to the start of its tumbling window."""
+    size = ROLLUP_WINDOWS[granularity]['size']
+    epoch = datetime(1970, 1, 1, tzinfo=timezone.utc)
+    return epoch + ((event_time - epoch) // size) * size
+
+def get_series_id(summary_id, granularity):
+    return f"{granularity}#{summary_id}"
+
+def update_rollups(summary_id, event_time):
+    """Increment the minute, hour and day window counters the event falls into."""
+    for granularity, window in ROLLUP_WINDOWS.items():
+        window_start = get_window_start(event_time, granularity)
+        expires_at = int((window_start + window['size'] + window['retention']).timestamp())
+
+        rollups_table.update_item(
+            Key={
+                'SeriesID': get_series_id(summary_id, granularity),
+                'WindowStart': window_start.isoformat()
+            },
+            UpdateExpression="ADD ItemCount :inc SET SummaryID = :summary, ExpiresAt = :expires",
+            ExpressionAttributeValues={
+                ':inc': 1,
+                ':summary': summary_id,
+                ':expires': expires_at
+            }
+        )
+
+def query_rollups(summary_id, granularity, start, end):
+    """
+    Read one SummaryID's time series for a granularity, covering windows that
+    start within [start, end]. Returns a list of (window_start, count) tuples.
+    """
+    if granularity not in ROLLUP_WINDOWS:
+        raise ValueError(f"Unknown granularity {granularity}, expected one of {list(ROLLUP_WINDOWS)}")
+
+    key_condition = (
+        Key('SeriesID').eq(get_series_id(summary_id, granularity)) &
+        Key('WindowStart').between(
+            get_window_start(start, granularity).isoformat(),
+            get_window_start(end, granularity).isoformat()
+        )
+    )
+
+    series = []
+    query_kwargs = {'KeyConditionExpression': key_condition}
+    while True:
+        response = rollups_table.query(**query_kwargs)
+        for item in response.get('Items', []):
+            series.append((datetime.fromisoformat(item['WindowStart']), int(item['ItemCount'])))
+
+        if 'LastEvaluatedKey' not in response:
+            return series
+        query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
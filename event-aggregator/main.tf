@@ -37,6 +37,34 @@ resource "aws_dynamodb_table" "summaries_table" {
     }
 }
 
+resource "aws_dynamodb_table" "rollups_table" {
+    name = "event-aggregator-rollups"
+    billing_mode = "PAY_PER_REQUEST"
+    hash_key = "SeriesID"
+    range_key = "WindowStart"
+
+    attribute {
+      name = "SeriesID"
+      type = "S"
+    }
+
+    attribute {
+      name = "WindowStart"
+      type = "S"
+    }
+
+    # Expire old minute/hour/day windows
+    ttl {
+      attribute_name = "ExpiresAt"
+      enabled = true
+    }
+
+    tags = {
+        Name = "event-aggregator-rollups"
+        Application = "EventAggregator"
+    }
+}
+
 # Data Producer Lambda
 resource "aws_iam_role" "lambda_exec_role" {
     name = "event-aggregator-lambda-role"
@@ -105,6 +133,15 @@ resource "aws_iam_role_policy" "lambda_dynamodb_policy" {
                 ]
                 Effect = "Allow"
                 Resource = aws_dynamodb_table.summaries_table.arn
+            },
+            # Access for aggregator lambda to time-windowed rollups
+            {
+                Action = [
+                    "dynamodb:UpdateItem",
+                    "dynamodb:Query"
+                ]
+                Effect = "Allow"
+                Resource = aws_dynamodb_table.rollups_table.arn
             }
         ]
     })
@@ -250,6 +287,7 @@ resource "aws_lambda_function" "event_aggregator_lambda" {
     environment {
       variables = {
         SUMMARIES_TABLE = aws_dynamodb_table.summaries_table.name
+        ROLLUPS_TABLE = aws_dynamodb_table.rollups_table.name
       }
     }
 }
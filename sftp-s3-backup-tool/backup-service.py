@@ -4,8 +4,16 @@ import json
 import tarfile
 import os
 import re
-from stat import S_ISDIR
-from datetime import datetime
+import shutil
+import threading
+import multiprocessing
+import queue
+import uuid
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from botocore.exceptions import ClientError
+from stat import S_ISDIR, S_ISLNK
+from datetime import datetime, timedelta
 from dotenv import load_dotenv
 
 # Load environment variables from .env file if available
@@ -20,11 +28,58 @@ LOCAL_BACKUP_PATH = os.getenv("LOCAL_BACKUP_PATH")
 S3_BUCKET = os.getenv("S3_BUCKET")
 DEFAULT_SFTP_PORT = int(os.getenv("SFTP_PORT", 22))
 TEMP_LOCAL_PATH = "/tmp/data"  # Define the temporary directory for backups
+DEFAULT_KEY_PREFIX = "backups"
+
+# Multi-source job settings
+BACKUP_JOB_FILE = os.getenv("BACKUP_JOB_FILE")
+MAX_CONCURRENT_SOURCES = int(os.getenv("MAX_CONCURRENT_SOURCES", 4))
+MAX_CONNECTIONS_PER_HOST = int(os.getenv("MAX_CONNECTIONS_PER_HOST", 2))
+# Above this estimated total size, a job is split across parallel invocations
+MAX_INVOCATION_BYTES = int(os.getenv("MAX_INVOCATION_BYTES", 256 * 1024 * 1024))
+# Split jobs record each source's result here, as partitions finish independently
+JOB_RESULTS_PREFIX = "job-results"
+
+# Checkpoint settings for resuming backups that outlast one invocation
+CHECKPOINT_PREFIX = "checkpoints"
+CHECKPOINT_MARGIN_SECONDS = int(os.getenv("CHECKPOINT_MARGIN_SECONDS", 60))
+# Measured from the last checkpoint, so a chain that stalled is resumed by the next daily run
+CHECKPOINT_MAX_AGE_HOURS = int(os.getenv("CHECKPOINT_MAX_AGE_HOURS", 48))
+MAX_CONTINUATIONS = int(os.getenv("MAX_CONTINUATIONS", 20))
+# Continuations allowed to retry a source from its checkpoint after an error
+MAX_ERROR_RETRIES = int(os.getenv("MAX_ERROR_RETRIES", 3))
+# Longest a resumed checkpoint is leased for, i.e. the Lambda timeout
+MAX_LEASE_SECONDS = 900
+UPLOAD_PART_BYTES = 8 * 1024 * 1024
+READ_CHUNK_BYTES = 1024 * 1024
+# Reads are prefetched one window at a time, bounding how much a slow upload lets buffer up
+PREFETCH_WINDOW_BYTES = 8 * 1024 * 1024
+PREFETCH_REQUESTS = 64
+
+# Sharded output: "single" streams one tar.gz, "sharded" writes parallel-compressed shards
+ARCHIVE_MODE = os.getenv("ARCHIVE_MODE", "single")
+SHARD_BY = os.getenv("SHARD_BY", "bytes")  # or "directory"
+SHARD_MAX_BYTES = int(os.getenv("SHARD_MAX_BYTES", 64 * 1024 * 1024))
+SHARD_WORKERS = int(os.getenv("SHARD_WORKERS", os.cpu_count() or 1))
+# Shard downloads and archives from every source share 80% of /tmp, sized by the stack
+EPHEMERAL_STORAGE_MB = int(os.getenv("EPHEMERAL_STORAGE_MB", 512))
+SCRATCH_BYTES = EPHEMERAL_STORAGE_MB * 1024 * 1024 * 4 // 5
+
+_process_context = multiprocessing.get_context("fork")
+_shard_workers = None
+_shard_workers_lock = threading.Lock()
+_host_semaphores = {}
+_host_semaphores_lock = threading.Lock()
+_client_lock = threading.Lock()
+
+def get_client(service_name, **kwargs):
+    """Create a boto3 client; creation on the default session isn't thread-safe."""
+    with _client_lock:
+        return boto3.client(service_name, **kwargs)
 
 def emit_success_metric():
     """Emit a CloudWatch metric indicating successful backup."""
     try:
-        cloudwatch = boto3.client('cloudwatch')
+        cloudwatch = get_client('cloudwatch')
         cloudwatch.put_metric_data(
             Namespace='SFTPBackup',
             MetricData=[
@@ -45,6 +100,33 @@ def emit_success_metric():
     except Exception as e:
         print(f"⚠️ Failed to emit success metric: {e}")
 
+def emit_source_metric(source_name, metric_name, value=1, unit='Count'):
+    """Emit a CloudWatch metric tagged with the backup source name."""
+    try:
+        cloudwatch = get_client('cloudwatch')
+        cloudwatch.put_metric_data(
+            Namespace='SFTPBackup',
+            MetricData=[
+                {
+                    'MetricName': metric_name,
+                    'Value': value,
+                    'Unit': unit,
+                    'Dimensions': [
+                        {
+                            'Name': 'FunctionName',
+                            'Value': os.environ.get('AWS_LAMBDA_FUNCTION_NAME', 'unknown')
+                        },
+                        {
+                            'Name': 'Source',
+                            'Value': source_name
+                        }
+                    ]
+                }
+            ]
+        )
+    except Exception as e:
+        print(f"⚠️ [{source_name}] Failed to emit {metric_name} metric: {e}")
+
 def parse_sftp_host(sftp_host):
     """Extract hostname and port if included in the host string."""
     sftp_host = sftp_host.replace("sftp://", "").strip()
@@ -54,11 +136,12 @@ def parse_sftp_host(sftp_host):
         return host, int(port)
     return sftp_host, DEFAULT_SFTP_PORT
 
-def get_sftp_credentials():
+def get_sftp_credentials(secret_name=None):
     """Fetch SFTP credentials from AWS Secrets Manager and extract host & port properly."""
-    print("🔹 Fetching SFTP credentials from AWS Secrets Manager...")
-    secrets_client = boto3.client("secretsmanager")
-    secret_value = secrets_client.get_secret_value(SecretId=SECRET_NAME)
+    secret_name = secret_name or SECRET_NAME
+    print(f"🔹 Fetching SFTP credentials for {secret_name} from AWS Secrets Manager...")
+    secrets_client = get_client("secretsmanager")
+    secret_value = secrets_client.get_secret_value(SecretId=secret_name)
     credentials = json.loads(secret_value["SecretString"])
 
     raw_host = credentials["SFTP_HOST"].strip()
@@ -74,9 +157,9 @@ def get_sftp_credentials():
         "port": sftp_port
     }
 
-def connect_sftp():
+def connect_sftp(credentials=None):
     """Establish an SFTP connection and return the session."""
-    credentials = get_sftp_credentials()
+    credentials = credentials or get_sftp_credentials()
     SFTP_HOST = credentials["host"]
     SFTP_USER = credentials["user"]
     SFTP_PASSWORD = credentials["password"]
@@ -105,99 +188,1137 @@ def connect_sftp():
     
     return None, None  
 
-def is_sftp_directory(sftp, remote_path):
-    """Check if a remote path is a directory on the SFTP server."""
+def get_default_source():
+    """The single source configured through SECRET_NAME / REMOTE_PATH."""
+    return {
+        "name": "default",
+        "secret_name": SECRET_NAME,
+        "remote_path": REMOTE_PATH,
+        "key_prefix": DEFAULT_KEY_PREFIX
+    }
+
+def load_backup_sources(event=None):
+    """
+    Build the list of sources to back up. The event's "sources" take precedence,
+    then the BACKUP_JOB_FILE job definition, then the single env-configured source.
+    """
+    if event and event.get("sources"):
+        raw_sources = event["sources"]
+    elif BACKUP_JOB_FILE:
+        print(f"🔹 Loading backup job from {BACKUP_JOB_FILE}...")
+        with open(BACKUP_JOB_FILE) as job_file:
+            raw_sources = json.load(job_file)["sources"]
+    else:
+        return [get_default_source()]
+
+    sources = []
+    for raw_source in raw_sources:
+        if not raw_source.get("secret_name") or not raw_source.get("remote_path"):
+            raise ValueError(f"Backup source needs secret_name and remote_path: {raw_source}")
+
+        name = re.sub(r"[^A-Za-z0-9_.-]", "-", raw_source.get("name") or raw_source["secret_name"])
+        sources.append({
+            **raw_source,
+            "name": name,
+            "key_prefix": raw_source.get("key_prefix") or f"{DEFAULT_KEY_PREFIX}/{name}"
+        })
+
+    names = [source["name"] for source in sources]
+    if len(names) != len(set(names)):
+        raise ValueError(f"Backup source names must be unique: {names}")
+
+    return sources
+
+def get_host_semaphore(host):
+    """Shared semaphore limiting concurrent connections to one SFTP host."""
+    with _host_semaphores_lock:
+        if host not in _host_semaphores:
+            _host_semaphores[host] = threading.BoundedSemaphore(MAX_CONNECTIONS_PER_HOST)
+        return _host_semaphores[host]
+
+def get_sftp_directory_size(sftp, remote_path):
+    """Recursively total the size of the files under a remote directory."""
+    total = 0
+    for attributes in sftp.listdir_attr(remote_path):
+        remote_item_path = f"{remote_path}/{attributes.filename}"
+        if S_ISDIR(attributes.st_mode):
+            total += get_sftp_directory_size(sftp, remote_item_path)
+        else:
+            total += attributes.st_size or 0
+    return total
+
+def get_recorded_size(source):
+    """Bytes read by the source's last successful backup, or None."""
+    s3 = get_client("s3")
     try:
-        return S_ISDIR(sftp.stat(remote_path).st_mode)
-    except IOError:
-        return False
+        recorded = s3.get_object(Bucket=S3_BUCKET, Key=get_checkpoint_key(source, "last-size.json"))
+    except s3.exceptions.NoSuchKey:
+        return None
+    return json.loads(recorded["Body"].read())["bytes"]
+
+def estimate_source_bytes(source):
+    """
+    Estimated backup size for a source, or None if it couldn't be determined. Uses the
+    job's estimated_bytes, then the size of the last successful backup, and only walks
+    the remote tree when neither is available.
+    """
+    if source.get("estimated_bytes") is not None:
+        return int(source["estimated_bytes"])
 
-def download_sftp_directory(sftp, remote_path, local_path):
-    """Recursively download directories from SFTP to local storage."""
-    if os.path.exists(local_path):
-        if not os.path.isdir(local_path):  
-            print(f"⚠️ Conflict detected: {local_path} exists as a file. Removing it.")
-            os.remove(local_path)
+    name = source["name"]
+    try:
+        size = get_recorded_size(source)
+        if size is not None:
+            print(f"📏 [{name}] Last backup size: {size} bytes")
+            return size
+
+        credentials = get_sftp_credentials(source["secret_name"])
+        with get_host_semaphore(credentials["host"]):
+            sftp, ssh = connect_sftp(credentials)
+            if not sftp or not ssh:
+                return None
+            try:
+                size = get_sftp_directory_size(sftp, source["remote_path"])
+            finally:
+                sftp.close()
+                ssh.close()
+        print(f"📏 [{name}] Estimated size: {size} bytes")
+        return size
+    except Exception as e:
+        print(f"⚠️ [{name}] Failed to estimate size: {e}")
+        return None
+
+def partition_sources(sources, sizes):
+    """Pack sources into groups whose estimated size fits MAX_INVOCATION_BYTES (first-fit decreasing)."""
+    partitions = []
+    for source, size in sorted(zip(sources, sizes), key=lambda pair: pair[1], reverse=True):
+        for partition in partitions:
+            if partition["bytes"] + size <= MAX_INVOCATION_BYTES:
+                partition["sources"].append(source)
+                partition["bytes"] += size
+                break
         else:
-            print(f"📂 Directory already exists: {local_path}")
-    else:
-        print(f"📂 Creating directory: {local_path}")
-        os.makedirs(local_path, exist_ok=True)
+            partitions.append({"sources": [source], "bytes": size})
+    return [partition["sources"] for partition in partitions]
+
+def get_time_remaining(context):
+    """Seconds left in this invocation, or unlimited when running outside Lambda."""
+    if context is None or not hasattr(context, "get_remaining_time_in_millis"):
+        return lambda: float("inf")
+    return lambda: context.get_remaining_time_in_millis() / 1000
+
+def get_checkpoint_key(source, filename):
+    return f"{CHECKPOINT_PREFIX}/{source['key_prefix']}/{filename}"
+
+class CheckpointConflict(Exception):
+    """Another invocation holds, or has just taken over, the source's checkpoint."""
 
-    for item in sftp.listdir(remote_path):
-        remote_item_path = f"{remote_path}/{item}"
-        local_item_path = os.path.join(local_path, item)
+def is_precondition_failure(error):
+    return error.response["Error"]["Code"] in ("PreconditionFailed", "ConditionalRequestConflict")
 
+class ResumableArchive:
+    """
+    A tar.gz streamed straight into an S3 multipart upload, whose progress can be
+    checkpointed to S3 and resumed by a later invocation. Each invocation appends a
+    new gzip member, and concatenated members read back as a single gzip stream.
+
+    Async invocations can be delivered twice, and Lambda retries failed ones, so two
+    invocations may try to resume the same checkpoint. Every checkpoint.json write is
+    conditional on the ETag this invocation last read or wrote, and resuming leases the
+    checkpoint until the invocation times out, so only one of them carries on. The lease
+    token travels with the source to its continuation, which may take over the lease.
+    """
+
+    def __init__(self, s3, source, state, pending=b"", pending_key=None):
+        self.s3 = s3
+        self.source = source
+        self.state = state
+        self.buffer = bytearray(pending)
+        self.pending_key = pending_key
+        self.has_checkpoint = False
+        self.etag = None  # Of the checkpoint.json this invocation holds
+        self.compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31 = gzip framing
+
+    @classmethod
+    def start(cls, s3, source):
+        timestamp = datetime.utcnow().strftime("%Y-%m-%d_%H-%M-%S")
+        s3_key = f"{source['key_prefix']}/backup_{timestamp}.tar.gz"
+        upload = s3.create_multipart_upload(Bucket=S3_BUCKET, Key=s3_key)
+        state = {
+            "s3_key": s3_key,
+            "upload_id": upload["UploadId"],
+            "parts": [],
+            "started_at": datetime.utcnow().isoformat(),
+            "invocations": 1,
+            # Walk cursor; both lists are stacks so the next entry is popped off the end
+            "pending_dirs": [{"path": source["remote_path"], "arcname": "data", "mtime": None}],
+            "pending_files": [],
+            "current_file": None,
+            "files_completed": 0,
+            # Files whose data couldn't all be read after their header was written
+            "zero_filled": [],
+            "bytes_read": 0,
+            "compressed_bytes": 0
+        }
+        return cls(s3, source, state)
+
+    @classmethod
+    def resume(cls, s3, source, time_remaining=lambda: float("inf")):
+        """
+        Load and lease the source's checkpoint, or return None if there is nothing usable
+        to resume. Raises CheckpointConflict if another invocation holds it.
+        """
+        try:
+            checkpoint = s3.get_object(Bucket=S3_BUCKET, Key=get_checkpoint_key(source, "checkpoint.json"))
+        except s3.exceptions.NoSuchKey:
+            return None
+
+        state = json.loads(checkpoint["Body"].read())
+        state.setdefault("zero_filled", [])
+        pending_key = state["pending_key"]
+        pending = s3.get_object(Bucket=S3_BUCKET, Key=pending_key)["Body"].read()
+        archive = cls(s3, source, state, pending, pending_key)
+        archive.etag = checkpoint["ETag"]
+
+        age = datetime.utcnow() - datetime.fromisoformat(state["checkpointed_at"])
+        if age > timedelta(hours=CHECKPOINT_MAX_AGE_HOURS):
+            print(f"⚠️ [{source['name']}] Discarding checkpoint from {state['checkpointed_at']}, starting over.")
+            archive.abort()
+            return None
+
+        leased_until = state.get("leased_until")
+        if (leased_until and datetime.fromisoformat(leased_until) > datetime.utcnow()
+                and state.get("leased_by") != source.get("lease")):
+            raise CheckpointConflict(f"Checkpoint is leased by another invocation until {leased_until}")
+
+        state["invocations"] += 1
+        lease_seconds = min(time_remaining(), MAX_LEASE_SECONDS) + CHECKPOINT_MARGIN_SECONDS
+        state["leased_until"] = (datetime.utcnow() + timedelta(seconds=lease_seconds)).isoformat()
+        state["leased_by"] = uuid.uuid4().hex
+        archive._put_checkpoint()
+        # Lets a retry after an error take the lease straight back
+        source["lease"] = state["leased_by"]
+        archive.has_checkpoint = True
+        return archive
+
+    def _put_checkpoint(self):
+        """Write checkpoint.json, provided nobody else has written it since this invocation did."""
+        condition = {"IfMatch": self.etag} if self.etag else {"IfNoneMatch": "*"}
+        try:
+            response = self.s3.put_object(
+                Bucket=S3_BUCKET,
+                Key=get_checkpoint_key(self.source, "checkpoint.json"),
+                Body=json.dumps(self.state),
+                **condition
+            )
+        except ClientError as e:
+            if is_precondition_failure(e):
+                raise CheckpointConflict("Checkpoint was written by another invocation")
+            raise
+        self.etag = response["ETag"]
+
+    def write(self, data):
+        self.buffer += self.compressor.compress(data)
+        if len(self.buffer) >= UPLOAD_PART_BYTES:
+            self._upload_part()
+
+    def _upload_part(self):
+        part_number = len(self.state["parts"]) + 1
+        response = self.s3.upload_part(
+            Bucket=S3_BUCKET,
+            Key=self.state["s3_key"],
+            UploadId=self.state["upload_id"],
+            PartNumber=part_number,
+            Body=bytes(self.buffer)
+        )
+        self.state["parts"].append({"PartNumber": part_number, "ETag": response["ETag"]})
+        self.state["compressed_bytes"] += len(self.buffer)
+        self.buffer = bytearray()
+
+    def checkpoint(self):
+        """
+        Close the current gzip member and save the cursor plus any bytes below the part
+        size. The bytes go to a key of their own that checkpoint.json names, so writing
+        checkpoint.json commits both at once.
+        """
+        self.buffer += self.compressor.flush()
+        self.compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+        previous_pending_key = self.pending_key
+        # Unique, so an invocation that loses a race never deletes the winner's bytes
+        self.pending_key = get_checkpoint_key(self.source, f"pending-{self.state['invocations']}-{uuid.uuid4().hex[:8]}.bin")
+        self.s3.put_object(Bucket=S3_BUCKET, Key=self.pending_key, Body=bytes(self.buffer))
+
+        self.state["pending_key"] = self.pending_key
+        self.state["checkpointed_at"] = datetime.utcnow().isoformat()
+        self.state["leased_until"] = None  # Free for the continuation to take
+        self.state["leased_by"] = None
         try:
-            if is_sftp_directory(sftp, remote_item_path):
-                download_sftp_directory(sftp, remote_item_path, local_item_path)
+            self._put_checkpoint()
+        except Exception:
+            # checkpoint.json still names the previous pending bytes
+            try:
+                self.s3.delete_object(Bucket=S3_BUCKET, Key=self.pending_key)
+            except Exception as e:
+                print(f"⚠️ [{self.source['name']}] Failed to delete {self.pending_key}: {e}")
+            self.pending_key = previous_pending_key
+            raise
+        self.has_checkpoint = True
+        if previous_pending_key and previous_pending_key != self.pending_key:
+            self.s3.delete_object(Bucket=S3_BUCKET, Key=previous_pending_key)
+
+    def complete(self):
+        self.write(b"\0" * (tarfile.BLOCKSIZE * 2))  # End-of-archive marker
+        self.buffer += self.compressor.flush()
+        self._upload_part()  # The last part may be smaller than the S3 minimum
+        self.s3.complete_multipart_upload(
+            Bucket=S3_BUCKET,
+            Key=self.state["s3_key"],
+            UploadId=self.state["upload_id"],
+            MultipartUpload={"Parts": self.state["parts"]}
+        )
+        self._delete_checkpoint()
+
+    def abort(self):
+        try:
+            self.s3.abort_multipart_upload(
+                Bucket=S3_BUCKET,
+                Key=self.state["s3_key"],
+                UploadId=self.state["upload_id"]
+            )
+        except Exception as e:
+            print(f"⚠️ [{self.source['name']}] Failed to abort multipart upload: {e}")
+        self._delete_checkpoint()
+
+    def _delete_checkpoint(self):
+        if not self.etag:
+            return  # Only the invocation holding checkpoint.json may remove it
+        self.s3.delete_object(Bucket=S3_BUCKET, Key=get_checkpoint_key(self.source, "checkpoint.json"))
+        if self.pending_key:
+            self.s3.delete_object(Bucket=S3_BUCKET, Key=self.pending_key)
+
+def add_remote_directory(sftp, archive, directory):
+    """Write a directory entry and queue up its contents."""
+    mtime = directory["mtime"]
+    if mtime is None:
+        mtime = sftp.stat(directory["path"]).st_mtime
+
+    info = tarfile.TarInfo(directory["arcname"])
+    info.type = tarfile.DIRTYPE
+    info.mode = 0o755
+    info.mtime = mtime
+    archive.write(info.tobuf(tarfile.GNU_FORMAT))
+
+    files, subdirectories = [], []
+    for attributes in sorted(sftp.listdir_attr(directory["path"]), key=lambda a: a.filename):
+        filename = attributes.filename
+        remote_item_path = f"{directory['path']}/{filename}"
+        if S_ISLNK(attributes.st_mode):
+            attributes = sftp.stat(remote_item_path)  # Follow links, as sftp.get() did
+        entry = {
+            "path": remote_item_path,
+            "arcname": f"{directory['arcname']}/{filename}",
+            "mtime": attributes.st_mtime
+        }
+        if S_ISDIR(attributes.st_mode):
+            subdirectories.append(entry)
+        else:
+            files.append({**entry, "size": attributes.st_size or 0, "offset": 0, "header_written": False})
+
+    archive.state["pending_files"].extend(reversed(files))
+    archive.state["pending_dirs"].extend(reversed(subdirectories))
+
+def stream_remote_file(sftp, archive, time_remaining):
+    """
+    Stream the current file into the archive from its saved offset.
+    Returns False if time ran out part way through the file.
+    """
+    state = archive.state
+    current = state["current_file"]
+
+    try:
+        remote_file = sftp.open(current["path"], "rb")
+    except IOError as e:
+        if not current["header_written"]:
+            print(f"❌ Error downloading {current['path']}, skipping it: {e}")
+            state["current_file"] = None
+            return True
+        # Its header is already in the archive, so keep the entry the promised size
+        print(f"❌ Error resuming {current['path']}, zero-filling the rest: {e}")
+        mark_zero_filled(state, current)
+        remote_file = None
+
+    try:
+        if not current["header_written"]:
+            print(f"⬇ Archiving file: {current['path']}")
+            info = tarfile.TarInfo(current["arcname"])
+            info.size = current["size"]
+            info.mtime = current["mtime"]
+            info.mode = 0o644
+            archive.write(info.tobuf(tarfile.GNU_FORMAT))
+            current["header_written"] = True
+
+        blocks = read_remote_blocks(remote_file, current["offset"], current["size"])
+        while current["offset"] < current["size"]:
+            if time_remaining() < CHECKPOINT_MARGIN_SECONDS:
+                return False
+
+            chunk, missing = next(blocks)
+            if missing:
+                mark_zero_filled(state, current)
+            archive.write(chunk)
+            current["offset"] += len(chunk)
+            state["bytes_read"] += len(chunk)
+    finally:
+        if remote_file is not None:
+            remote_file.close()
+
+    archive.write(b"\0" * (-current["size"] % tarfile.BLOCKSIZE))
+    state["files_completed"] += 1
+    state["current_file"] = None
+    return True
+
+def mark_zero_filled(state, current):
+    if current["arcname"] not in state["zero_filled"]:
+        state["zero_filled"].append(current["arcname"])
+
+def read_remote_blocks(remote_file, offset, size):
+    """
+    Yield (block, missing_bytes) for the file from offset up to size in READ_CHUNK_BYTES
+    blocks, prefetching one PREFETCH_WINDOW_BYTES window at a time so reads can't run
+    far ahead of compression and uploads. Data that's missing because the file shrank
+    since it was listed, or couldn't be opened, is zero-filled so the entry matches the
+    size in its header; missing_bytes says how much of the block that is.
+    """
+    while offset < size:
+        window_end = min(size, offset + PREFETCH_WINDOW_BYTES)
+        chunks = [(start, min(READ_CHUNK_BYTES, window_end - start)) for start in range(offset, window_end, READ_CHUNK_BYTES)]
+        blocks = remote_file.readv(chunks, PREFETCH_REQUESTS) if remote_file is not None else iter(())
+        for _, length in chunks:
+            try:
+                block = next(blocks, b"")
+            except EOFError:
+                block = b""
+            yield block + b"\0" * (length - len(block)), length - len(block)
+        offset = window_end
+
+def stream_source_archive(sftp, archive, time_remaining):
+    """
+    Walk the remote tree from the archive's cursor, streaming each entry into it.
+    Returns False if time ran out before the walk finished.
+    """
+    state = archive.state
+    while True:
+        if state["current_file"]:
+            if not stream_remote_file(sftp, archive, time_remaining):
+                return False
+        elif time_remaining() < CHECKPOINT_MARGIN_SECONDS:
+            return False
+        elif state["pending_files"]:
+            state["current_file"] = state["pending_files"].pop()
+        elif state["pending_dirs"]:
+            add_remote_directory(sftp, archive, state["pending_dirs"].pop())
+        else:
+            return True
+
+class ShardWorkerPool:
+    """
+    Compression worker processes, each taking tasks over its own Pipe. Lambda has no
+    /dev/shm, which multiprocessing.Pool and ProcessPoolExecutor rely on.
+
+    Forking a process that is running paramiko transport threads, boto3 and the source
+    thread pool can leave a child holding a lock one of them had. So the workers are
+    forked when the handler starts, before this invocation starts any threads, and warm
+    invocations reuse them. Only a worker that died is replaced mid-invocation.
+    """
+
+    def __init__(self, size):
+        self.idle = queue.Queue()
+        for _ in range(size):
+            self.idle.put(self._spawn())
+
+    def _spawn(self):
+        connection, worker_connection = _process_context.Pipe()
+        process = _process_context.Process(target=_process_worker, args=(worker_connection,), daemon=True)
+        process.start()
+        worker_connection.close()
+        return process, connection
+
+    def run(self, func, *args):
+        """Run func(*args) in an idle worker and return its result."""
+        process, connection = self.idle.get()
+        try:
+            # By name, as this module isn't always importable under its own name
+            connection.send((func.__name__, args))
+            succeeded, value = connection.recv()
+        except (EOFError, OSError):
+            connection.close()
+            process.join()
+            self.idle.put(self._spawn())
+            raise RuntimeError(f"Worker process exited with code {process.exitcode}")
+
+        self.idle.put((process, connection))
+        if not succeeded:
+            raise RuntimeError(value)
+        return value
+
+    def close(self):
+        """Stop the idle workers; only call once no tasks are running."""
+        while not self.idle.empty():
+            process, connection = self.idle.get()
+            # Other workers hold copies of this pipe, so the worker won't see it close
+            connection.send(None)
+            connection.close()
+            process.join()
+
+def _process_worker(connection):
+    while True:
+        try:
+            task = connection.recv()
+        except EOFError:
+            return
+        if task is None:
+            return
+        func_name, args = task
+        try:
+            connection.send((True, globals()[func_name](*args)))
+        except Exception as e:
+            connection.send((False, repr(e)))
+
+def get_shard_workers():
+    """The shared compression workers, forked on first use."""
+    global _shard_workers
+    with _shard_workers_lock:
+        if _shard_workers is None:
+            _shard_workers = ShardWorkerPool(SHARD_WORKERS)
+        return _shard_workers
+
+class ScratchBudget:
+    """Bytes of /tmp that shard downloads and archives may hold at once, shared by every source."""
+
+    def __init__(self, total_bytes):
+        self.total_bytes = total_bytes
+        self.available = total_bytes
+        self.condition = threading.Condition()
+
+    def acquire(self, size, give_up=lambda: False):
+        """Reserve size bytes, waiting for space; returns the bytes reserved, or None if give_up()."""
+        size = min(size, self.total_bytes)
+        with self.condition:
+            while self.available < size:
+                if give_up():
+                    return None
+                self.condition.wait(1)
+            self.available -= size
+        return size
+
+    def release(self, size):
+        with self.condition:
+            self.available += size
+            self.condition.notify_all()
+
+_scratch_budget = ScratchBudget(SCRATCH_BYTES)
+
+def compress_shard(files, archive_path):
+    """Write (local_path, arcname) pairs to a tar.gz. Runs in a worker process."""
+    with tarfile.open(archive_path, "w:gz") as tar:
+        for local_path, arcname in files:
+            tar.add(local_path, arcname=arcname)
+    return os.path.getsize(archive_path)
+
+def list_remote_files(sftp, remote_path, arcname="data"):
+    """Walk the remote tree, returning its files and directories in depth-first order."""
+    files, directories = [], [arcname]
+    for attributes in sorted(sftp.listdir_attr(remote_path), key=lambda a: a.filename):
+        filename = attributes.filename
+        remote_item_path = f"{remote_path}/{filename}"
+        if S_ISLNK(attributes.st_mode):
+            attributes = sftp.stat(remote_item_path)
+
+        if S_ISDIR(attributes.st_mode):
+            sub_files, sub_directories = list_remote_files(sftp, remote_item_path, f"{arcname}/{filename}")
+            files.extend(sub_files)
+            directories.extend(sub_directories)
+        else:
+            files.append({
+                "path": remote_item_path,
+                "arcname": f"{arcname}/{filename}",
+                "size": attributes.st_size or 0
+            })
+    return files, directories
+
+def plan_shards(files, shard_by=None, max_bytes=None):
+    """
+    Group files, in walk order, into shards of at most max_bytes. A larger file is split
+    into byte ranges stored as <arcname>.part-NNNNN, one shard each, which the restore
+    joins back up. With shard_by "directory", shards also break between top-level
+    directories so restoring one directory only touches its own shards.
+    """
+    shard_by = shard_by or SHARD_BY
+    # A shard and its archive have to fit in /tmp together
+    max_bytes = min(max_bytes or SHARD_MAX_BYTES, SCRATCH_BYTES // 2)
+
+    pieces = []
+    for file in files:
+        if file["size"] <= max_bytes:
+            pieces.append(file)
+            continue
+        for index, offset in enumerate(range(0, file["size"], max_bytes)):
+            pieces.append({
+                **file,
+                "arcname": f"{file['arcname']}.part-{index:05d}",
+                "size": min(max_bytes, file["size"] - offset),
+                "offset": offset,
+                "split_from": file["arcname"]
+            })
+
+    shards, current, current_bytes, current_group = [], [], 0, None
+    for file in pieces:
+        parts = file["arcname"].split("/")
+        group = parts[1] if shard_by == "directory" and len(parts) > 2 else None
+        if current and (current_bytes + file["size"] > max_bytes or group != current_group):
+            shards.append(current)
+            current, current_bytes = [], 0
+        current.append(file)
+        current_bytes += file["size"]
+        current_group = group
+    if current:
+        shards.append(current)
+
+    return [
+        {"id": index, "files": shard, "bytes": sum(file["size"] for file in shard)}
+        for index, shard in enumerate(shards)
+    ]
+
+def download_shard(sftp, shard, shard_dir):
+    """
+    Download a shard's files to local storage, returning (local_path, arcname) pairs.
+    Any failed download fails the shard, so the source is retried rather than the
+    snapshot silently missing a file or one piece of a split file.
+    """
+    downloaded = []
+    for file in shard["files"]:
+        local_path = os.path.join(shard_dir, file["arcname"])
+        os.makedirs(os.path.dirname(local_path), exist_ok=True)
+        print(f"⬇ Downloading file: {file['path']} → {local_path}")
+        try:
+            if "offset" in file:
+                download_range(sftp, file, local_path)
             else:
-                print(f"⬇ Downloading file: {remote_item_path} → {local_item_path}")
-                sftp.get(remote_item_path, local_item_path)
+                sftp.get(file["path"], local_path)
         except Exception as e:
-            print(f"❌ Error downloading {remote_item_path}: {e}")
+            raise IOError(f"Error downloading {file['path']}: {e}") from e
+        downloaded.append((local_path, file["arcname"]))
+    return downloaded
+
+def download_range(sftp, file, local_path):
+    """Download one byte range of a file that is split across shards."""
+    remote_file = sftp.open(file["path"], "rb")
+    try:
+        with open(local_path, "wb") as local_file:
+            for block, missing in read_remote_blocks(remote_file, file["offset"], file["offset"] + file["size"]):
+                if missing:
+                    # The other pieces were sized from the listing, so they can't be joined
+                    raise IOError(f"{file['path']} is shorter than when it was listed")
+                local_file.write(block)
+    finally:
+        remote_file.close()
 
-def backup_sftp_data():
-    """Connect to SFTP, clear old data, download files, compress them, and upload to S3."""
-    print("🔹 Starting backup process...")
+def compress_and_upload_shard(s3, snapshot_prefix, shard, shard_dir, files, reserved_bytes):
+    """Compress a downloaded shard in a worker process, upload it and clean up."""
+    archive_path = f"{shard_dir}.tar.gz"
+    try:
+        compressed_bytes = get_shard_workers().run(compress_shard, files, archive_path)
+        s3_key = f"{snapshot_prefix}/shard-{shard['id']:05d}.tar.gz"
+        s3.upload_file(archive_path, S3_BUCKET, s3_key)
+        print(f"✅ Uploaded shard {s3_key} ({len(files)} files, {compressed_bytes} bytes)")
+        return {
+            "id": shard["id"],
+            "key": s3_key,
+            "files": [arcname for _, arcname in files],
+            "bytes": shard["bytes"],
+            "compressed_bytes": compressed_bytes
+        }
+    finally:
+        shutil.rmtree(shard_dir, ignore_errors=True)
+        if os.path.exists(archive_path):
+            os.remove(archive_path)
+        _scratch_budget.release(reserved_bytes)
 
-    # ✅ Ensure a clean directory before downloading
-    if os.path.exists(TEMP_LOCAL_PATH):
-        print("🧹 Clearing old backup data...")
-        os.system(f"rm -rf {TEMP_LOCAL_PATH}")
+def load_shard_checkpoint(s3, source):
+    try:
+        checkpoint = s3.get_object(Bucket=S3_BUCKET, Key=get_checkpoint_key(source, "shards.json"))
+    except s3.exceptions.NoSuchKey:
+        return None
 
-    sftp, ssh = connect_sftp()
-    if not sftp or not ssh:
-        print("❌ Failed to connect to SFTP. Exiting backup process.")
-        return {"status": "SFTP connection failed"}
+    state = json.loads(checkpoint["Body"].read())
+    age = datetime.utcnow() - datetime.fromisoformat(state["checkpointed_at"])
+    if age > timedelta(hours=CHECKPOINT_MAX_AGE_HOURS):
+        print(f"⚠️ [{source['name']}] Discarding sharded checkpoint from {state['checkpointed_at']}, starting over.")
+        for entry in state["completed"].values():
+            s3.delete_object(Bucket=S3_BUCKET, Key=entry["key"])
+        s3.delete_object(Bucket=S3_BUCKET, Key=get_checkpoint_key(source, "shards.json"))
+        return None
+    return state
 
-    print("✅ SFTP session opened.")
+def save_shard_checkpoint(s3, source, state):
+    state["checkpointed_at"] = datetime.utcnow().isoformat()
+    s3.put_object(
+        Bucket=S3_BUCKET,
+        Key=get_checkpoint_key(source, "shards.json"),
+        Body=json.dumps(state)
+    )
 
-    os.makedirs(TEMP_LOCAL_PATH, exist_ok=True)  # Ensure fresh directory
+def backup_sharded_snapshot(sftp, s3, source, time_remaining):
+    """
+    Back up the source as size-bounded tar.gz shards compressed in parallel worker
+    processes and uploaded concurrently under one snapshot prefix, plus a manifest.
+    Completed shards are checkpointed, so a continuation only redoes unfinished ones.
+    """
+    name = source["name"]
+    state = load_shard_checkpoint(s3, source)
+    if state:
+        print(f"🔹 [{name}] Resuming {state['snapshot_prefix']} with {len(state['completed'])} of {len(state['shards'])} shards done...")
+    else:
+        files, directories = list_remote_files(sftp, source["remote_path"])
+        timestamp = datetime.utcnow().strftime("%Y-%m-%d_%H-%M-%S")
+        state = {
+            "snapshot_prefix": f"{source['key_prefix']}/snapshot_{timestamp}",
+            "started_at": datetime.utcnow().isoformat(),
+            "directories": directories,
+            "shards": plan_shards(files, source.get("shard_by"), source.get("shard_max_bytes")),
+            "completed": {}
+        }
+        print(f"🔹 [{name}] Planned {len(state['shards'])} shards for {len(files)} files, using {SHARD_WORKERS} workers...")
 
-    print(f"🔹 Downloading from {REMOTE_PATH}...")
+    scratch_dir = os.path.join(TEMP_LOCAL_PATH, name)
+    futures = []
+    out_of_time = False
     try:
-        download_sftp_directory(sftp, REMOTE_PATH, TEMP_LOCAL_PATH)
+        with ThreadPoolExecutor(max_workers=SHARD_WORKERS) as executor:
+            for shard in state["shards"]:
+                if str(shard["id"]) in state["completed"]:
+                    continue
+                if time_remaining() < CHECKPOINT_MARGIN_SECONDS:
+                    out_of_time = True
+                    break
+
+                # Room for the downloaded files plus their archive, shared with other sources
+                reserved_bytes = _scratch_budget.acquire(
+                    2 * shard["bytes"], give_up=lambda: time_remaining() < CHECKPOINT_MARGIN_SECONDS
+                )
+                if reserved_bytes is None:
+                    out_of_time = True
+                    break
+                shard_dir = os.path.join(scratch_dir, f"shard-{shard['id']:05d}")
+                try:
+                    files = download_shard(sftp, shard, shard_dir)
+                except Exception:
+                    _scratch_budget.release(reserved_bytes)
+                    raise
+                futures.append(executor.submit(
+                    compress_and_upload_shard, s3, state["snapshot_prefix"], shard, shard_dir, files, reserved_bytes
+                ))
+
+            for future in futures:
+                entry = future.result()
+                state["completed"][str(entry["id"])] = entry
     except Exception as e:
-        print(f"❌ Error during download: {e}")
-        return {"status": f"Error downloading files: {e}"}
+        print(f"❌ [{name}] Error during sharded backup: {e}")
+        # Finished shards are independent objects, so keep them for the next attempt
+        for future in futures:
+            if future.done() and not future.exception():
+                state["completed"][str(future.result()["id"])] = future.result()
+        save_shard_checkpoint(s3, source, state)
+        return source_result(source, f"Error backing up files: {e}", retryable=True)
+    finally:
+        shutil.rmtree(scratch_dir, ignore_errors=True)
+
+    if out_of_time:
+        save_shard_checkpoint(s3, source, state)
+        print(f"⏳ [{name}] Checkpointed after {len(state['completed'])} of {len(state['shards'])} shards, continuing in a new invocation.")
+        return source_result(source, "Backup checkpointed", continued=True)
+
+    shards = sorted(state["completed"].values(), key=lambda entry: entry["id"])
+    split_files = {}
+    for shard in state["shards"]:
+        for file in shard["files"]:
+            if "split_from" in file:
+                split_files[file["split_from"]] = split_files.get(file["split_from"], 0) + 1
+    manifest_key = f"{state['snapshot_prefix']}/manifest.json"
+    s3.put_object(
+        Bucket=S3_BUCKET,
+        Key=manifest_key,
+        Body=json.dumps({
+            "source": name,
+            "remote_path": source["remote_path"],
+            "created_at": datetime.utcnow().isoformat(),
+            "directories": state["directories"],
+            # Files stored as <arcname>.part-NNNNN pieces, with their piece counts
+            "split_files": split_files,
+            "shards": shards
+        }, indent=2)
+    )
+    s3.delete_object(Bucket=S3_BUCKET, Key=get_checkpoint_key(source, "shards.json"))
+    print(f"✅ [{name}] Snapshot uploaded to S3: {manifest_key} ({len(shards)} shards)")
+
+    emit_source_metric(name, "BackupSizeBytes", sum(entry["compressed_bytes"] for entry in shards), unit="Bytes")
 
-    sftp.close()
-    ssh.close()
-    print("✅ All files downloaded.")
+    print(f"✅ [{name}] Backup process completed successfully.")
+    return source_result(
+        source, "Backup successful", success=True, s3_key=manifest_key,
+        source_bytes=sum(entry["bytes"] for entry in shards)
+    )
 
-    print("🔹 Compressing backup...")
+def source_result(source, status, success=False, s3_key=None, continued=False, source_bytes=None, retryable=False,
+                  zero_filled=None, duplicate=False):
+    return {
+        "source": source["name"],
+        "status": status,
+        "success": success,
+        "s3_key": s3_key,
+        "continued": continued,
+        "bytes": source_bytes,
+        "retryable": retryable,
+        "zero_filled": zero_filled or [],
+        # Set when another invocation is already backing up the source
+        "duplicate": duplicate
+    }
+
+def backup_source(source, time_remaining=lambda: float("inf")):
+    """
+    Connect to SFTP and stream the remote files as a tar.gz into S3, checkpointing
+    and returning a continued result if the invocation is about to run out of time.
+    """
+    name = source["name"]
     try:
-        with tarfile.open(LOCAL_BACKUP_PATH, "w:gz") as tar:
-            tar.add(TEMP_LOCAL_PATH, arcname="data")
-        print("✅ Backup compressed.")
+        result = _backup_source(source, time_remaining)
     except Exception as e:
-        print(f"❌ Error compressing backup: {e}")
-        return {"status": f"Error compressing backup: {e}"}
+        print(f"❌ [{name}] Unexpected error: {e}")
+        result = source_result(source, f"Unexpected error: {e}")
 
-    print(f"🔹 Uploading backup to S3 bucket {S3_BUCKET}...")
-    s3 = boto3.client("s3")
-    timestamp = datetime.utcnow().strftime("%Y-%m-%d_%H-%M-%S")
-    s3_key = f"backups/backup_{timestamp}.tar.gz"
+    retries = source.get("retries", 0)
+    if result["retryable"] and retries < MAX_ERROR_RETRIES:
+        # Progress is checkpointed, so hand the source to a continuation rather than fail it
+        source["retries"] = retries + 1
+        print(f"🔁 [{name}] Retrying from the last checkpoint ({retries + 1} of {MAX_ERROR_RETRIES})...")
+        result.update(status=f"Retrying after error: {result['status']}", continued=True)
+
+    if not result["continued"] and not result["duplicate"]:
+        emit_source_metric(name, "SuccessfulBackup" if result["success"] else "FailedBackup")
+    if result["success"] and result["bytes"] is not None:
+        record_source_size(source, result["bytes"])
+    return result
+
+def record_source_size(source, size):
+    """Saved so the next job can decide whether to split without walking the remote tree."""
     try:
-        s3.upload_file(LOCAL_BACKUP_PATH, S3_BUCKET, s3_key)
-        print(f"✅ Backup uploaded to S3: {s3_key}")
+        get_client("s3").put_object(
+            Bucket=S3_BUCKET,
+            Key=get_checkpoint_key(source, "last-size.json"),
+            Body=json.dumps({"bytes": size, "recorded_at": datetime.utcnow().isoformat()})
+        )
     except Exception as e:
-        print(f"❌ Error uploading to S3: {e}")
-        return {"status": f"Error uploading to S3: {e}"}
+        print(f"⚠️ [{source['name']}] Failed to record backup size: {e}")
 
-    print("🔹 Cleaning up temporary files...")
-    os.system(f"rm -rf {TEMP_LOCAL_PATH} {LOCAL_BACKUP_PATH}")
+def _backup_source(source, time_remaining):
+    name = source["name"]
+    if time_remaining() < CHECKPOINT_MARGIN_SECONDS:
+        print(f"⏳ [{name}] Not enough time left to start, deferring to a continuation.")
+        return source_result(source, "Backup deferred to a continuation", continued=True)
 
-    # Emit success metric
-    emit_success_metric()
+    print(f"🔹 [{name}] Starting backup process...")
+    s3 = get_client("s3")
 
-    print("✅ Backup process completed successfully.")
-    return {"status": "Backup successful"}
+    credentials = get_sftp_credentials(source["secret_name"])
+    with get_host_semaphore(credentials["host"]):
+        sftp, ssh = connect_sftp(credentials)
+        if not sftp or not ssh:
+            print(f"❌ [{name}] Failed to connect to SFTP. Exiting backup process.")
+            return source_result(source, "SFTP connection failed", retryable=True)
+
+        print(f"✅ [{name}] SFTP session opened.")
+
+        try:
+            if source.get("archive_mode", ARCHIVE_MODE) == "sharded":
+                return backup_sharded_snapshot(sftp, s3, source, time_remaining)
+            return backup_single_archive(sftp, s3, source, time_remaining)
+        finally:
+            sftp.close()
+            ssh.close()
+
+def backup_single_archive(sftp, s3, source, time_remaining):
+    """Stream the source into one tar.gz, resuming from a checkpoint if there is one."""
+    name = source["name"]
+    try:
+        archive = ResumableArchive.resume(s3, source, time_remaining)
+    except CheckpointConflict as e:
+        print(f"⚠️ [{name}] {e}, leaving the source to it.")
+        return source_result(source, f"Skipped: {e}", duplicate=True)
+    except Exception as e:
+        print(f"❌ [{name}] Error resuming from checkpoint: {e}")
+        return source_result(source, f"Error resuming from checkpoint: {e}", retryable=True)
+    if archive:
+        print(f"🔹 [{name}] Resuming {archive.state['s3_key']} after {archive.state['files_completed']} files...")
+    else:
+        archive = ResumableArchive.start(s3, source)
+        print(f"🔹 [{name}] Streaming {source['remote_path']} to S3 bucket {S3_BUCKET}...")
+
+    try:
+        finished = stream_source_archive(sftp, archive, time_remaining)
+        if not finished:
+            archive.checkpoint()
+            print(f"⏳ [{name}] Checkpointed after {archive.state['files_completed']} files, continuing in a new invocation.")
+            return source_result(source, "Backup checkpointed", s3_key=archive.state["s3_key"], continued=True)
+        archive.complete()
+    except CheckpointConflict as e:
+        print(f"⚠️ [{name}] {e}, leaving the source to it.")
+        if not archive.has_checkpoint:
+            archive.abort()  # Only this invocation's own upload
+        return source_result(source, f"Skipped: {e}", duplicate=True)
+    except Exception as e:
+        print(f"❌ [{name}] Error during backup: {e}")
+        # Progress since the last checkpoint can't be trusted, so a retry resumes from that checkpoint
+        if not archive.has_checkpoint:
+            archive.abort()
+        return source_result(source, f"Error backing up files: {e}", retryable=True)
+
+    s3_key = archive.state["s3_key"]
+    print(f"✅ [{name}] Backup uploaded to S3: {s3_key} ({archive.state['files_completed']} files)")
+
+    emit_source_metric(name, "BackupSizeBytes", archive.state["compressed_bytes"], unit="Bytes")
+
+    zero_filled = archive.state["zero_filled"]
+    if zero_filled:
+        # The archive is readable, but these entries hold zeros where data is missing
+        s3.put_object(
+            Bucket=S3_BUCKET,
+            Key=f"{s3_key}.zero-filled.json",
+            Body=json.dumps({"s3_key": s3_key, "zero_filled": zero_filled}, indent=2)
+        )
+        print(f"❌ [{name}] {len(zero_filled)} files could not be fully read and were zero-filled: {zero_filled}")
+        return source_result(
+            source, f"Backup incomplete: {len(zero_filled)} files zero-filled", s3_key=s3_key,
+            source_bytes=archive.state["bytes_read"], zero_filled=zero_filled
+        )
+
+    print(f"✅ [{name}] Backup process completed successfully.")
+    return source_result(
+        source, "Backup successful", success=True, s3_key=s3_key,
+        source_bytes=archive.state["bytes_read"]
+    )
+
+def run_sources_concurrently(sources, time_remaining):
+    """Back up sources in this invocation, bounded by MAX_CONCURRENT_SOURCES."""
+    if len(sources) == 1:
+        return [backup_source(sources[0], time_remaining)]
+
+    with ThreadPoolExecutor(max_workers=min(MAX_CONCURRENT_SOURCES, len(sources))) as executor:
+        return list(executor.map(lambda source: backup_source(source, time_remaining), sources))
+
+def get_job_key(job_id, filename):
+    return f"{JOB_RESULTS_PREFIX}/{job_id}/{filename}"
+
+def invoke_partition(function_name, job_id, partition_index, sources):
+    """Start one partition of the job in its own asynchronous invocation."""
+    print(f"🔹 Invoking partition {partition_index} with {len(sources)} sources...")
+    get_client("lambda").invoke(
+        FunctionName=function_name,
+        InvocationType="Event",
+        Payload=json.dumps({"sources": sources, "partition": partition_index, "job_id": job_id})
+    )
+
+def dispatch_partitions(sources, function_name):
+    """
+    Split the job across asynchronous invocations of function_name when its estimated
+    total is above MAX_INVOCATION_BYTES. Returns the dispatched job, or None if the job
+    fits in this invocation. Partitions record their results under job-results/<job_id>/.
+    """
+    with ThreadPoolExecutor(max_workers=min(MAX_CONCURRENT_SOURCES, len(sources))) as executor:
+        estimates = list(executor.map(estimate_source_bytes, sources))
+    # Unknown sizes are assumed to need an invocation of their own
+    sizes = [MAX_INVOCATION_BYTES if size is None else size for size in estimates]
+    if sum(sizes) <= MAX_INVOCATION_BYTES:
+        return None
+    partitions = partition_sources(sources, sizes)
+    if len(partitions) == 1:
+        return None
+
+    job_id = create_job(sources, len(partitions))
+    print(f"🔹 Estimated {sum(sizes)} bytes, splitting job {job_id} across {len(partitions)} invocations...")
+
+    results, failed = [], []
+    for index, partition in enumerate(partitions):
+        try:
+            invoke_partition(function_name, job_id, index, partition)
+            results.extend(source_result(source, f"Running in partition {index}") for source in partition)
+        except Exception as e:
+            print(f"❌ Partition {index} failed to start: {e}")
+            for source in partition:
+                emit_source_metric(source["name"], "FailedBackup")
+                failed.append(source_result(source, f"Partition invocation failed: {e}"))
+    if failed:
+        record_job_results(job_id, failed)
+
+    return {
+        "status": f"Backup split across {len(partitions)} invocations",
+        "job_id": job_id,
+        "dispatched": True,
+        "results": results + failed
+    }
+
+def create_job(sources, partitions=1):
+    """Record the sources of a job that spans invocations; returns its job_id."""
+    job_id = f"{datetime.utcnow().strftime('%Y-%m-%d_%H-%M-%S')}-{uuid.uuid4().hex[:8]}"
+    get_client("s3").put_object(
+        Bucket=S3_BUCKET,
+        Key=get_job_key(job_id, "job.json"),
+        Body=json.dumps({
+            "sources": [source["name"] for source in sources],
+            "partitions": partitions,
+            "started_at": datetime.utcnow().isoformat()
+        })
+    )
+    return job_id
+
+def record_job_results(job_id, results):
+    """
+    Save finished sources' results for a job that spans invocations. Whichever
+    invocation records the last of them writes the job summary and emits the
+    job-level success metric.
+    """
+    s3 = get_client("s3")
+    for result in results:
+        s3.put_object(
+            Bucket=S3_BUCKET,
+            Key=get_job_key(job_id, f"sources/{result['source']}.json"),
+            Body=json.dumps(result)
+        )
+
+    job = json.loads(s3.get_object(Bucket=S3_BUCKET, Key=get_job_key(job_id, "job.json"))["Body"].read())
+    result_keys = [
+        item["Key"]
+        for page in s3.get_paginator("list_objects_v2").paginate(Bucket=S3_BUCKET, Prefix=get_job_key(job_id, "sources/"))
+        for item in page.get("Contents", [])
+    ]
+    if len(result_keys) < len(job["sources"]):
+        return None
+
+    summary = summarize_results([
+        json.loads(s3.get_object(Bucket=S3_BUCKET, Key=key)["Body"].read())
+        for key in result_keys
+    ])
+    try:
+        s3.put_object(
+            Bucket=S3_BUCKET,
+            Key=get_job_key(job_id, "summary.json"),
+            Body=json.dumps(summary, indent=2),
+            IfNoneMatch="*"
+        )
+    except ClientError as e:
+        if e.response["Error"]["Code"] in ("PreconditionFailed", "ConditionalRequestConflict"):
+            return None  # Another invocation recorded its last result at the same time
+        raise
+
+    print(f"✅ Job {job_id} finished: {summary['status']}")
+    if all(result["success"] for result in summary["results"]):
+        emit_success_metric()
+    return summary
+
+def summarize_results(results):
+    failures = [result for result in results if not result["success"] and not result["continued"]]
+    continued = [result for result in results if result["continued"]]
+    if not results:
+        status = "No sources left to back up in this invocation"
+    elif failures:
+        status = f"Backup failed for {len(failures)} of {len(results)} sources"
+    elif continued:
+        status = f"Backup continuing for {len(continued)} of {len(results)} sources"
+    else:
+        status = "Backup successful"
+    return {"status": status, "results": results}
+
+def continue_backup_job(function_name, sources, continuation, job_id=None):
+    """
+    Hand unfinished sources to a new invocation, which resumes them from their checkpoints.
+    Returns False if the continuation limit was reached.
+    """
+    if continuation > MAX_CONTINUATIONS:
+        print(f"❌ Giving up after {MAX_CONTINUATIONS} continuations, checkpoints are kept for the next run.")
+        return False
+
+    print(f"🔹 Starting continuation {continuation} for {len(sources)} source(s)...")
+    payload = {"sources": sources, "continuation": continuation}
+    if job_id:
+        payload["job_id"] = job_id
+    get_client("lambda").invoke(
+        FunctionName=function_name,
+        InvocationType="Event",
+        Payload=json.dumps(payload)
+    )
+    return True
+
+def run_backup_job(sources, allow_fan_out=True, function_name=None, time_remaining=lambda: float("inf")):
+    """
+    Back up every source concurrently in this invocation or, when the estimated total
+    is above MAX_INVOCATION_BYTES, dispatch it across invocations of function_name.
+    """
+    print(f"🔹 Starting backup job for {len(sources)} source(s)...")
+
+    if allow_fan_out and function_name and len(sources) > 1:
+        dispatched = dispatch_partitions(sources, function_name)
+        if dispatched:
+            return dispatched
+
+    return summarize_results(run_sources_concurrently(sources, time_remaining))
 
 def lambda_handler(event, context):
-    return backup_sftp_data()
+    event = event or {}
+    sources = load_backup_sources(event)
+
+    # Partitions and continuations carry on a job started by an earlier invocation
+    job_id = event.get("job_id")
+    continuation = event.get("continuation", 0)
+    function_name = getattr(context, "function_name", None)
+    if any(source.get("archive_mode", ARCHIVE_MODE) == "sharded" for source in sources):
+        get_shard_workers()  # Fork the workers before any threads start
+    result = run_backup_job(
+        sources,
+        allow_fan_out=not job_id and not continuation,
+        function_name=function_name,
+        time_remaining=get_time_remaining(context)
+    )
+    if result.get("dispatched"):
+        print(f"✅ Backup job dispatched: {result['status']}")
+        return result
+    if any(r["duplicate"] for r in result["results"]):
+        # Sources another invocation is already running are its to continue and record
+        result = summarize_results([r for r in result["results"] if not r["duplicate"]])
+
+    continued = {r["source"] for r in result["results"] if r["continued"]}
+    if continued and not job_id:
+        # Continuations only carry the unfinished sources, so the job-level metric has
+        # to wait for job-results/ to hold every source's result
+        job_id = create_job(sources)
+    if continued and not continue_backup_job(function_name, [s for s in sources if s["name"] in continued], continuation + 1, job_id):
+        for r in result["results"]:
+            if r["continued"]:
+                emit_source_metric(r["source"], "FailedBackup")
+                r.update(status=f"Gave up after {MAX_CONTINUATIONS} continuations", continued=False)
+        result = summarize_results(result["results"])
+
+    if job_id:
+        record_job_results(job_id, [r for r in result["results"] if not r["continued"]])
+    elif result["results"] and all(r["success"] for r in result["results"]):
+        # The whole job finished in this invocation
+        emit_success_metric()
+
+    print(f"✅ Backup job finished: {result['status']}")
+    return result
 
 if __name__ == "__main__":
     print("🔹 Running backup locally...")
-    backup_sftp_data()
\ No newline at end of file
+    sources = load_backup_sources()
+    if any(source.get("archive_mode", ARCHIVE_MODE) == "sharded" for source in sources):
+        get_shard_workers()
+    result = run_backup_job(sources, allow_fan_out=False)
+    print(json.dumps(result, indent=2))
\ No newline at end of file
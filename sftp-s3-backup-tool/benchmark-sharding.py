@@ -0,0 +1,88 @@
+import argparse
+import importlib.util
+import os
+import shutil
+import tarfile
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+# backup-service.py isn't importable by name because of the hyphen
+spec = importlib.util.spec_from_file_location("backup_service", Path(__file__).parent / "backup-service.py")
+backup_service = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(backup_service)
+
+def generate_data(root, total_mb, file_mb):
+    """Write a mix of compressible text and incompressible files, spread over a few directories."""
+    file_bytes = int(file_mb * 1024 * 1024)
+    files = []
+    for index in range(max(1, int(total_mb / file_mb))):
+        directory = os.path.join(root, "data", f"dir-{index % 8}")
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"file-{index:04d}.bin")
+        with open(path, "wb") as f:
+            if index % 3 == 0:
+                f.write(os.urandom(file_bytes))
+            else:
+                line = f"{index},partner-export,{'x' * (index % 50)},2024-01-01T00:00:00Z\n".encode()
+                f.write((line * (file_bytes // len(line) + 1))[:file_bytes])
+        files.append({"path": path, "arcname": os.path.relpath(path, root), "size": file_bytes})
+    return files
+
+def time_single(root, output_dir):
+    start = time.perf_counter()
+    with tarfile.open(os.path.join(output_dir, "single.tar.gz"), "w:gz") as tar:
+        tar.add(os.path.join(root, "data"), arcname="data")
+    return time.perf_counter() - start
+
+def time_sharded(files, output_dir, workers, shard_mb):
+    # Forked after pinning, so the workers inherit this run's CPU affinity
+    pool = backup_service.ShardWorkerPool(workers)
+    try:
+        start = time.perf_counter()
+        shards = backup_service.plan_shards(files, "bytes", int(shard_mb * 1024 * 1024))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(
+                lambda shard: pool.run(
+                    backup_service.compress_shard,
+                    [(file["path"], file["arcname"]) for file in shard["files"]],
+                    os.path.join(output_dir, f"shard-{shard['id']:05d}.tar.gz")
+                ),
+                shards
+            ))
+        return time.perf_counter() - start, len(shards)
+    finally:
+        pool.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare single-archive and sharded compression wall-clock time.")
+    parser.add_argument("--size-mb", type=float, default=256, help="Total synthetic data size")
+    parser.add_argument("--file-mb", type=float, default=4, help="Size of each synthetic file")
+    parser.add_argument("--shard-mb", type=float, default=32, help="Shard byte budget")
+    parser.add_argument("--vcpus", type=int, nargs="+", default=[1, 2, 4, 6], help="CPU counts to pin to")
+    args = parser.parse_args()
+
+    available_cpus = sorted(os.sched_getaffinity(0))
+    print(f"🔹 Host has {len(available_cpus)} CPUs available")
+
+    root = tempfile.mkdtemp()
+    try:
+        files = generate_data(root, args.size_mb, args.file_mb)
+        print(f"🔹 Generated {len(files)} files, {args.size_mb} MB")
+        print(f"{'vCPUs':>6} {'single (s)':>11} {'sharded (s)':>12} {'shards':>7} {'speedup':>8}")
+
+        for vcpus in args.vcpus:
+            # Pin this process, and the workers it forks, to the first N CPUs
+            os.sched_setaffinity(0, available_cpus[:vcpus])
+            output_dir = tempfile.mkdtemp()
+            try:
+                single = time_single(root, output_dir)
+                sharded, shard_count = time_sharded(files, output_dir, vcpus, args.shard_mb)
+            finally:
+                shutil.rmtree(output_dir)
+            note = "" if vcpus <= len(available_cpus) else f" (only {len(available_cpus)} CPUs available)"
+            print(f"{vcpus:>6} {single:>11.2f} {sharded:>12.2f} {shard_count:>7} {single / sharded:>7.2f}x{note}")
+    finally:
+        os.sched_setaffinity(0, available_cpus)
+        shutil.rmtree(root)
@@ -9,6 +9,7 @@ from aws_cdk import (
     aws_cloudwatch as cloudwatch,
     aws_cloudwatch_actions as cloudwatch_actions,
     Duration,
+    Size,
     RemovalPolicy,
     CfnOutput,
     DockerImage,
@@ -16,6 +17,7 @@ from aws_cdk import (
 )
 from constructs import Construct
 import os
+import json
 from dotenv import load_dotenv
 from pathlib import Path
 from .constants import (
@@ -25,6 +27,7 @@ from .constants import (
     LAMBDA_RUNTIME,
     LAMBDA_MEMORY,
     LAMBDA_TIMEOUT,
+    EPHEMERAL_STORAGE_MB,
     LAMBDA_ENV_VARS,
     ENV_VARS,
     TAGS
@@ -34,6 +37,14 @@ from .constants import (
 env_path = Path(__file__).parents[2] / '.env'
 load_dotenv(dotenv_path=env_path)
 
+def load_backup_job_secrets():
+    """Secret names referenced by the multi-source job definition, if one is configured."""
+    if not ENV_VARS.get("BACKUP_JOB_FILE"):
+        return []
+    job_path = Path(__file__).parents[2] / ENV_VARS["BACKUP_JOB_FILE"]
+    with open(job_path) as job_file:
+        return [source["secret_name"] for source in json.load(job_file)["sources"]]
+
 class BackupStack(Stack):
     def __init__(self, scope: Construct, id: str, **kwargs) -> None:
         super().__init__(scope, id, description=STACK_DESCRIPTION, **kwargs)
@@ -62,12 +73,19 @@ class BackupStack(Stack):
             removal_policy=RemovalPolicy.RETAIN,
             lifecycle_rules=[
                 s3.LifecycleRule(
+                    # Clean up uploads left behind by backups that never finished
+                    abort_incomplete_multipart_upload_after=Duration.days(7),
                     transitions=[
                         s3.Transition(
                             storage_class=s3.StorageClass.INTELLIGENT_TIERING,
                             transition_after=Duration.days(30)
                         )
                     ]
+                ),
+                s3.LifecycleRule(
+                    # Per-source results of jobs split across invocations
+                    prefix="job-results/",
+                    expiration=Duration.days(30)
                 )
             ]
         )
@@ -90,7 +108,10 @@ class BackupStack(Stack):
                 actions=[
                     "s3:PutObject",
                     "s3:GetObject",
-                    "s3:ListBucket"
+                    "s3:ListBucket",
+                    # Checkpointed backups are streamed as multipart uploads
+                    "s3:AbortMultipartUpload",
+                    "s3:DeleteObject"
                 ],
                 resources=[
                     self.backup_bucket.bucket_arn,
@@ -99,13 +120,29 @@ class BackupStack(Stack):
             )
         )
 
+        secret_names = {ENV_VARS['SECRET_NAME'], *load_backup_job_secrets()} - {None}
         lambda_role.add_to_policy(
             iam.PolicyStatement(
                 actions=[
                     "secretsmanager:GetSecretValue"
                 ],
                 resources=[
-                    f"arn:aws:secretsmanager:{self.region}:{self.account}:secret:{ENV_VARS['SECRET_NAME']}-*"
+                    f"arn:aws:secretsmanager:{self.region}:{self.account}:secret:{secret_name}-*"
+                    for secret_name in sorted(secret_names)
+                ]
+            )
+        )
+
+        # Allow the function to split large multi-source jobs across invocations of itself,
+        # and to hand checkpointed backups off to a continuation.
+        # Built from the name prefix, as referencing the function ARN here would be circular.
+        lambda_role.add_to_policy(
+            iam.PolicyStatement(
+                actions=[
+                    "lambda:InvokeFunction"
+                ],
+                resources=[
+                    f"arn:aws:lambda:{self.region}:{self.account}:function:{STACK_NAME}-BackupFunction*"
                 ]
             )
         )
@@ -120,6 +157,13 @@ class BackupStack(Stack):
             )
         )
 
+        # Bundle the multi-source job definition with the function, if one is configured
+        job_env_vars = {}
+        bundle_job_command = ""
+        if ENV_VARS.get("BACKUP_JOB_FILE"):
+            job_env_vars["BACKUP_JOB_FILE"] = os.path.basename(ENV_VARS["BACKUP_JOB_FILE"])
+            bundle_job_command = f" && cp {ENV_VARS['BACKUP_JOB_FILE']} /asset-output/"
+
         # Create Lambda function with bundling options
         self.lambda_function = lambda_.Function(
             self,
@@ -140,14 +184,16 @@ class BackupStack(Stack):
                             --only-binary=:all: --upgrade \
                             -r requirements.txt && \
                         cp backup-service.py /asset-output/
-                        """
+                        """ + bundle_job_command
                     ]
                 }
             ),
             memory_size=LAMBDA_MEMORY,
             timeout=Duration.seconds(LAMBDA_TIMEOUT),
+            ephemeral_storage_size=Size.mebibytes(EPHEMERAL_STORAGE_MB),
             environment={
                 **LAMBDA_ENV_VARS,
+                **job_env_vars,
                 "S3_BUCKET": self.backup_bucket.bucket_name
             },
             role=lambda_role
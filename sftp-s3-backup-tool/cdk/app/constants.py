@@ -14,8 +14,12 @@ STACK_DESCRIPTION = "Infrastructure for SFTP to S3 backup service"
 # Lambda configuration
 LAMBDA_HANDLER = "backup-service.lambda_handler"
 LAMBDA_RUNTIME = "python3.9"
-LAMBDA_MEMORY = 512
+# Lambda vCPUs scale with memory (~1 vCPU per 1769 MB, up to 6 at 10240 MB),
+# so raise this when using the sharded archive mode
+LAMBDA_MEMORY = int(os.getenv("LAMBDA_MEMORY", 512))
 LAMBDA_TIMEOUT = 900  # 15 minutes
+# /tmp size; sharded snapshots keep shard downloads and archives there
+EPHEMERAL_STORAGE_MB = int(os.getenv("EPHEMERAL_STORAGE_MB", 2048))
 
 # Environment variables loaded from .env
 ENV_VARS = {
@@ -23,15 +27,20 @@ ENV_VARS = {
     "REMOTE_PATH": os.getenv("REMOTE_PATH"),
     "LOCAL_BACKUP_PATH": os.getenv("LOCAL_BACKUP_PATH"),
     "S3_BUCKET": os.getenv("S3_BUCKET"),
-    "ALERT_EMAIL": os.getenv("ALERT_EMAIL")
+    "ALERT_EMAIL": os.getenv("ALERT_EMAIL"),
+    # Optional multi-source job definition, relative to the sftp-s3-backup-tool directory
+    "BACKUP_JOB_FILE": os.getenv("BACKUP_JOB_FILE")
 }
 
 # Lambda environment variables (subset of ENV_VARS)
 LAMBDA_ENV_VARS: Dict[str, str] = {
     "SECRET_NAME": ENV_VARS["SECRET_NAME"],
     "REMOTE_PATH": ENV_VARS["REMOTE_PATH"],
-    "LOCAL_BACKUP_PATH": ENV_VARS["LOCAL_BACKUP_PATH"]
+    "LOCAL_BACKUP_PATH": ENV_VARS["LOCAL_BACKUP_PATH"],
+    "ARCHIVE_MODE": os.getenv("ARCHIVE_MODE", "single"),
+    "EPHEMERAL_STORAGE_MB": str(EPHEMERAL_STORAGE_MB)
     # Note: S3_BUCKET is dynamically set in the stack using the bucket name
+    # Note: BACKUP_JOB_FILE is set in the stack when a job definition is bundled
 }
 
 # Tags
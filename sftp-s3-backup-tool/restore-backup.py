@@ -0,0 +1,120 @@
+import argparse
+import boto3
+import json
+import os
+import re
+import shutil
+import sys
+import tarfile
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+
+# Load environment variables from .env file if available
+if os.path.exists(".env"):
+    load_dotenv()
+    print("✅ .env file loaded")
+
+S3_BUCKET = os.getenv("S3_BUCKET")
+
+def select_shards(manifest, paths):
+    """Shards holding any file under the given archive paths (e.g. data/reports), or all of them."""
+    if not paths:
+        return manifest["shards"]
+    prefixes = [path.rstrip("/") for path in paths]
+    split_files = manifest.get("split_files", {})
+    return [
+        shard for shard in manifest["shards"]
+        if any(is_under(original_name(arcname, split_files), prefixes) for arcname in shard["files"])
+    ]
+
+def original_name(arcname, split_files):
+    """The file a <arcname>.part-NNNNN piece belongs to, or arcname itself."""
+    match = re.fullmatch(r"(.*)\.part-\d{5}", arcname)
+    if match and match.group(1) in split_files:
+        return match.group(1)
+    return arcname
+
+def is_under(arcname, prefixes):
+    return any(arcname == prefix or arcname.startswith(f"{prefix}/") for prefix in prefixes)
+
+def restore_shard(s3, bucket, shard, destination, paths, split_files):
+    """Download one shard and extract it, limited to the requested paths if any."""
+    with tempfile.NamedTemporaryFile(suffix=".tar.gz") as archive_file:
+        print(f"⬇ Downloading shard {shard['key']}...")
+        s3.download_fileobj(bucket, shard["key"], archive_file)
+        archive_file.flush()
+
+        with tarfile.open(archive_file.name, "r:gz") as tar:
+            members = [
+                member for member in tar.getmembers()
+                if not paths or is_under(original_name(member.name, split_files), [path.rstrip("/") for path in paths])
+            ]
+            if hasattr(tarfile, "data_filter"):
+                tar.extractall(destination, members=members, filter="data")
+            else:
+                tar.extractall(destination, members=members)
+    return len(members)
+
+def join_parts(path, part_count):
+    """Rebuild a file that was split across shards from its extracted pieces."""
+    missing = [
+        f"{path}.part-{index:05d}" for index in range(part_count)
+        if not os.path.exists(f"{path}.part-{index:05d}")
+    ]
+    if missing:
+        print(f"❌ Can't rebuild {path}, {len(missing)} of {part_count} pieces are missing: {missing}")
+        return False
+
+    print(f"🔹 Joining {part_count} pieces into {path}...")
+    with open(path, "wb") as output:
+        for index in range(part_count):
+            part_path = f"{path}.part-{index:05d}"
+            with open(part_path, "rb") as part:
+                shutil.copyfileobj(part, output)
+            os.remove(part_path)
+    return True
+
+def restore_snapshot(manifest_key, destination, bucket=None, paths=None, workers=8):
+    """Restore a sharded snapshot from its manifest, fetching only the shards that are needed."""
+    bucket = bucket or S3_BUCKET
+    s3 = boto3.client("s3")
+
+    manifest = json.loads(s3.get_object(Bucket=bucket, Key=manifest_key)["Body"].read())
+    shards = select_shards(manifest, paths)
+    split_files = manifest.get("split_files", {})
+    print(f"🔹 Restoring {len(shards)} of {len(manifest['shards'])} shards to {destination}...")
+
+    for directory in manifest["directories"]:
+        if not paths or is_under(directory, [path.rstrip("/") for path in paths]):
+            os.makedirs(os.path.join(destination, directory), exist_ok=True)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        counts = list(executor.map(
+            lambda shard: restore_shard(s3, bucket, shard, destination, paths, split_files), shards
+        ))
+
+    incomplete = []
+    for arcname, part_count in split_files.items():
+        if not paths or is_under(arcname, [path.rstrip("/") for path in paths]):
+            if not join_parts(os.path.join(destination, arcname), part_count):
+                incomplete.append(arcname)
+
+    if incomplete:
+        print(f"❌ Restored {sum(counts)} entries from {len(shards)} shards, but {len(incomplete)} split files are incomplete: {incomplete}")
+        return False
+    print(f"✅ Restored {sum(counts)} entries from {len(shards)} shards.")
+    return True
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Restore a sharded SFTP backup snapshot from S3.")
+    parser.add_argument("manifest_key", help="S3 key of the snapshot's manifest.json")
+    parser.add_argument("destination", help="Local directory to restore into")
+    parser.add_argument("--bucket", default=S3_BUCKET, help="S3 bucket (defaults to S3_BUCKET)")
+    parser.add_argument("--path", action="append", dest="paths",
+                        help="Only restore this archive path, e.g. data/reports (repeatable)")
+    parser.add_argument("--workers", type=int, default=8, help="Shards downloaded concurrently")
+    args = parser.parse_args()
+
+    if not restore_snapshot(args.manifest_key, args.destination, args.bucket, args.paths, args.workers):
+        sys.exit(1)
@@ -0,0 +1,200 @@
+import argparse
+import importlib.util
+import io
+import json
+import os
+import shutil
+import tarfile
+import tempfile
+from pathlib import Path
+
+import boto3
+from moto import mock_aws
+
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+os.environ["S3_BUCKET"] = "checkpoint-test-bucket"
+os.environ["SECRET_NAME"] = "checkpoint-test-sftp"
+os.environ["REMOTE_PATH"] = "/"
+
+# backup-service.py isn't importable by name because of the hyphen
+spec = importlib.util.spec_from_file_location("backup_service", Path(__file__).parent / "backup-service.py")
+backup_service = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(backup_service)
+
+class LocalSftpFile:
+    def __init__(self, sftp, path):
+        self.sftp = sftp
+        self.file = open(path, "rb")
+
+    def readv(self, chunks, max_concurrent_prefetch_requests=None):
+        for offset, length in chunks:
+            self.sftp.reads += 1
+            if self.sftp.reads == self.sftp.fail_on_read:
+                raise IOError("Simulated SFTP read failure")
+            self.file.seek(offset)
+            yield self.file.read(length)
+
+    def close(self):
+        self.file.close()
+
+class LocalSftp:
+    """Stands in for paramiko's SFTPClient, serving a local directory."""
+
+    def __init__(self, root, fail_on_read=None):
+        self.root = root
+        self.reads = 0
+        self.fail_on_read = fail_on_read
+
+    def _local(self, path):
+        return os.path.join(self.root, path.lstrip("/"))
+
+    def stat(self, path):
+        return os.stat(self._local(path))
+
+    def listdir_attr(self, path):
+        entries = []
+        for filename in os.listdir(self._local(path)):
+            attributes = paramiko_attributes(os.lstat(os.path.join(self._local(path), filename)))
+            attributes.filename = filename
+            entries.append(attributes)
+        return entries
+
+    def open(self, path, mode="rb"):
+        return LocalSftpFile(self, self._local(path))
+
+    def close(self):
+        pass
+
+def paramiko_attributes(stat_result):
+    return backup_service.paramiko.SFTPAttributes.from_stat(stat_result)
+
+class ShortTimeoutContext:
+    """A Lambda context whose clock runs down by step_seconds on every check."""
+    function_name = "checkpoint-test"
+
+    def __init__(self, timeout_seconds, step_seconds):
+        self.remaining = timeout_seconds
+        self.step_seconds = step_seconds
+
+    def get_remaining_time_in_millis(self):
+        self.remaining -= self.step_seconds
+        return self.remaining * 1000
+
+class QueuedLambda:
+    """Collects the asynchronous continuations so the test can run them in order."""
+
+    def __init__(self):
+        self.queue = []
+
+    def invoke(self, FunctionName, InvocationType, Payload):
+        self.queue.append(json.loads(Payload))
+        return {"StatusCode": 202}
+
+class FailingCheckpointS3:
+    """Wraps the S3 client to fail one checkpoint.json write, as if the invocation died there."""
+
+    def __init__(self, s3, fail_on_checkpoint):
+        self.s3 = s3
+        self.checkpoints = 0
+        self.fail_on_checkpoint = fail_on_checkpoint
+
+    def put_object(self, **kwargs):
+        if kwargs["Key"].endswith("checkpoint.json"):
+            self.checkpoints += 1
+            if self.checkpoints == self.fail_on_checkpoint:
+                raise IOError("Simulated failure writing checkpoint.json")
+        return self.s3.put_object(**kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.s3, name)
+
+def generate_tree(root, files, file_kb):
+    for index in range(files):
+        directory = os.path.join(root, f"dir-{index % 3}", "nested" if index % 2 else "")
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, f"file-{index:03d}.bin"), "wb") as f:
+            f.write(os.urandom(file_kb * 1024) if index % 3 == 0 else (b"partner-export,%d\n" % index) * (file_kb * 64))
+    os.makedirs(os.path.join(root, "empty"))
+
+def compare_archive(body, root):
+    """Return the files whose archived contents differ from the source, plus any missing."""
+    mismatches = []
+    archived = set()
+    with tarfile.open(fileobj=io.BytesIO(body), mode="r:gz") as tar:
+        for member in tar.getmembers():
+            if not member.isfile():
+                continue
+            relative_path = member.name[len("data/"):]
+            archived.add(relative_path)
+            with open(os.path.join(root, relative_path), "rb") as f:
+                if tar.extractfile(member).read() != f.read():
+                    mismatches.append(relative_path)
+
+    for directory, _, filenames in os.walk(root):
+        for filename in filenames:
+            relative_path = os.path.relpath(os.path.join(directory, filename), root)
+            if relative_path not in archived:
+                mismatches.append(f"{relative_path} (missing)")
+    return mismatches
+
+def run_chain(root, args):
+    sftp = LocalSftp(root, fail_on_read=args.fail_on_read)
+    lambda_client = QueuedLambda()
+    s3 = FailingCheckpointS3(boto3.client("s3"), args.fail_on_checkpoint)
+    backup_service.connect_sftp = lambda credentials: (sftp, sftp)
+    backup_service.get_client = lambda service_name, **kwargs: {"lambda": lambda_client, "s3": s3}.get(service_name) or boto3.client(service_name, **kwargs)
+    backup_service.READ_CHUNK_BYTES = 64 * 1024
+    backup_service.PREFETCH_WINDOW_BYTES = 256 * 1024
+    backup_service.UPLOAD_PART_BYTES = 5 * 1024 * 1024  # The S3 minimum part size
+
+    invocations = []
+    lambda_client.queue.append({})
+    while lambda_client.queue:
+        event = lambda_client.queue.pop(0)
+        result = backup_service.lambda_handler(event, ShortTimeoutContext(args.timeout_seconds, args.step_seconds))
+        invocations.append(result)
+    return invocations
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a checkpointed backup against local SFTP and S3 stand-ins with a short simulated timeout.")
+    parser.add_argument("--files", type=int, default=40)
+    parser.add_argument("--file-kb", type=int, default=512)
+    parser.add_argument("--timeout-seconds", type=float, default=200, help="Simulated time per invocation")
+    parser.add_argument("--step-seconds", type=float, default=1, help="Simulated time used per time check")
+    parser.add_argument("--fail-on-read", type=int, default=250, help="Fail this SFTP read once (0 to disable)")
+    parser.add_argument("--fail-on-checkpoint", type=int, default=3, help="Fail this checkpoint.json write once (0 to disable)")
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp()
+    try:
+        generate_tree(root, args.files, args.file_kb)
+        with mock_aws():
+            boto3.client("s3").create_bucket(Bucket=os.environ["S3_BUCKET"])
+            boto3.client("secretsmanager").create_secret(
+                Name=os.environ["SECRET_NAME"],
+                SecretString=json.dumps({"SFTP_HOST": "localhost", "SFTP_USER": "test", "SFTP_PASSWORD": "test"})
+            )
+
+            invocations = run_chain(root, args)
+
+            s3 = boto3.client("s3")
+            keys = [item["Key"] for item in s3.list_objects_v2(Bucket=os.environ["S3_BUCKET"]).get("Contents", [])]
+            archive_keys = [key for key in keys if key.startswith("backups/")]
+            leftover_checkpoints = [key for key in keys if key.startswith("checkpoints/") and not key.endswith("last-size.json")]
+
+            print(f"🔹 {len(invocations)} invocations:")
+            for index, result in enumerate(invocations, 1):
+                print(f"   {index}: {[r['status'] for r in result['results']]}")
+
+            final = invocations[-1]["results"][0]
+            assert final["success"], f"Backup did not succeed: {final['status']}"
+            assert len(invocations) > 1, "The backup finished in one invocation, shorten --timeout-seconds"
+            assert archive_keys == [final["s3_key"]], f"Expected one archive, found {archive_keys}"
+            assert not leftover_checkpoints, f"Checkpoint objects were left behind: {leftover_checkpoints}"
+
+            body = s3.get_object(Bucket=os.environ["S3_BUCKET"], Key=final["s3_key"])["Body"].read()
+            mismatches = compare_archive(body, root)
+            assert not mismatches, f"Archive differs from the source: {mismatches}"
+            print(f"✅ Archive of {args.files} files matches the source after {len(invocations)} invocations")
+    finally:
+        shutil.rmtree(root)
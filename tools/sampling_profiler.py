@@ -0,0 +1,200 @@
+import atexit
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+
+# Shared by the ECS tasks; their deploy_image.sh scripts pass this directory to
+# docker build as the "tools" build context.
+
+class SamplingProfiler:
+    """
+    Samples the Python stacks of every thread from a background thread and counts them
+    as collapsed stacks ("thread;outer;...;inner count"), ready for flamegraph.pl or
+    speedscope. Counts are written out every window_seconds, on SIGUSR1, and on
+    SIGTERM or normal exit.
+
+    The sampler holds the GIL while it walks the stacks, so it stretches its interval
+    to keep that time under max_overhead of wall-clock time. In "cpu" mode a thread
+    is only counted when it used CPU since the previous sample, so threads blocked on
+    SQS long polling don't swamp the profile; "wall" mode counts every thread.
+    """
+
+    def __init__(self, output, interval_seconds=0.01, window_seconds=60, max_overhead=0.01,
+                 mode="cpu", max_stacks=10000, name=None):
+        self.output = output
+        self.interval_seconds = interval_seconds
+        self.window_seconds = window_seconds
+        self.max_overhead = max_overhead
+        self.mode = mode if hasattr(time, "pthread_getcpuclockid") else "wall"
+        self.max_stacks = max_stacks
+        self.name = name or os.path.splitext(os.path.basename(sys.argv[0]))[0] or "python"
+
+        self.stacks = Counter()
+        self.samples = 0
+        self.dropped = 0
+        self.sampling_seconds = 0.0
+        self.window_start = time.monotonic()
+        self.cpu_times = {}
+        self.labels = {}
+
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.flush_requested = False
+        self.flushes = 0
+        self.running = False
+        self.thread = None
+        self.previous_sigterm = None
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self.thread.start()
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGUSR1, lambda signum, frame: self.request_flush())
+            # ECS stops tasks with SIGTERM, which kills the process without running atexit
+            self.previous_sigterm = signal.signal(signal.SIGTERM, self._handle_sigterm)
+        atexit.register(self.stop)
+        print(f"Sampling profiler started: {self.mode} mode, every {self.interval_seconds * 1000:g} ms, "
+              f"writing every {self.window_seconds:g}s to {self.output}")
+        return self
+
+    def stop(self):
+        """Stop sampling and write out whatever was collected."""
+        if not self.running:
+            return
+        self.running = False
+        self.wake.set()
+        self.thread.join()
+        self.flush()
+
+    def request_flush(self):
+        # Runs in the signal handler, so leave the writing to the sampler thread
+        self.flush_requested = True
+        self.wake.set()
+
+    def _handle_sigterm(self, signum, frame):
+        self.stop()
+        if callable(self.previous_sigterm):
+            self.previous_sigterm(signum, frame)
+        elif self.previous_sigterm != signal.SIG_IGN:
+            sys.exit(128 + signum)
+
+    def sample(self):
+        """Record one stack per thread; returns the seconds spent doing it."""
+        start = time.perf_counter()
+        own_id = threading.get_ident()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        cpu_times = {}
+        sampled = []
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_id or not self._used_cpu(thread_id, cpu_times):
+                continue
+            frames = []
+            while frame is not None:
+                frames.append(self._label(frame.f_code))
+                frame = frame.f_back
+            frames.append(names.get(thread_id, f"thread-{thread_id}"))
+            sampled.append(";".join(reversed(frames)))
+        # Only keep CPU times for threads that still exist
+        self.cpu_times = cpu_times
+
+        with self.lock:
+            for stack in sampled:
+                if stack in self.stacks or len(self.stacks) < self.max_stacks:
+                    self.stacks[stack] += 1
+                else:
+                    self.dropped += 1
+            self.samples += 1
+            elapsed = time.perf_counter() - start
+            self.sampling_seconds += elapsed
+        return elapsed
+
+    def flush(self):
+        """Write the current window's stacks and start a new window."""
+        with self.lock:
+            stacks, self.stacks = self.stacks, Counter()
+            samples, dropped, sampling_seconds = self.samples, self.dropped, self.sampling_seconds
+            self.samples, self.dropped, self.sampling_seconds = 0, 0, 0.0
+            window_seconds = time.monotonic() - self.window_start
+            self.window_start = time.monotonic()
+
+        if not stacks:
+            return None
+        if dropped:
+            stacks["[dropped: max stacks reached]"] = dropped
+
+        body = "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+        try:
+            location = self._write(body)
+        except Exception as e:
+            print(f"Failed to write profile: {e}")
+            return None
+
+        print(f"Profile written to {location}: {samples} samples over {window_seconds:.0f}s, "
+              f"{len(stacks)} stacks, sampler overhead {sampling_seconds / max(window_seconds, 1e-9):.2%}")
+        return location
+
+    def _run(self):
+        while self.running:
+            cost = self.sample()
+            # Sleep long enough that sampling stays under max_overhead of wall time
+            self.wake.wait(max(self.interval_seconds, cost / self.max_overhead - cost))
+            self.wake.clear()
+            if self.flush_requested or time.monotonic() - self.window_start >= self.window_seconds:
+                self.flush_requested = False
+                self.flush()
+
+    def _used_cpu(self, thread_id, cpu_times):
+        if self.mode != "cpu":
+            return True
+        try:
+            cpu_time = time.clock_gettime(time.pthread_getcpuclockid(thread_id))
+        except (OSError, OverflowError):
+            return True
+        previous = self.cpu_times.get(thread_id)
+        cpu_times[thread_id] = cpu_time
+        return previous is None or cpu_time > previous
+
+    def _label(self, code):
+        label = self.labels.get(code)
+        if label is None:
+            label = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+            self.labels[code] = label
+        return label
+
+    def _write(self, body):
+        timestamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        self.flushes += 1
+        file_name = f"{self.name}-{socket.gethostname()}-{os.getpid()}-{timestamp}-{self.flushes:04d}.collapsed"
+
+        if self.output.startswith("s3://"):
+            import boto3
+            bucket, _, prefix = self.output[len("s3://"):].partition("/")
+            key = f"{prefix.rstrip('/')}/{file_name}" if prefix else file_name
+            boto3.client("s3").put_object(Bucket=bucket, Key=key, Body=body.encode("utf-8"))
+            return f"s3://{bucket}/{key}"
+
+        os.makedirs(self.output, exist_ok=True)
+        path = os.path.join(self.output, file_name)
+        with open(path, "w") as f:
+            f.write(body)
+        return path
+
+def start_from_env():
+    """Start a profiler if PROFILER_ENABLED is true; returns it, or None."""
+    if os.getenv("PROFILER_ENABLED", "false").lower() != "true":
+        return None
+
+    return SamplingProfiler(
+        output=os.getenv("PROFILER_OUTPUT", "/tmp/profiles"),
+        interval_seconds=float(os.getenv("PROFILER_INTERVAL_MS", 10)) / 1000,
+        window_seconds=float(os.getenv("PROFILER_WINDOW_SECONDS", 60)),
+        max_overhead=float(os.getenv("PROFILER_MAX_OVERHEAD", 0.01)),
+        mode=os.getenv("PROFILER_MODE", "cpu"),
+        max_stacks=int(os.getenv("PROFILER_MAX_STACKS", 10000))
+    ).start()
@@ -0,0 +1,85 @@
+import argparse
+import importlib.util
+import json
+import os
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+os.environ.setdefault("SQS_QUEUE_URL", "https://sqs.us-east-1.amazonaws.com/000000000000/benchmark")
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+
+# webhook-ingress.py isn't importable by name because of the hyphen
+spec = importlib.util.spec_from_file_location("webhook_ingress", Path(__file__).parent / "ecs-tasks" / "webhook-ingress.py")
+webhook_ingress = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(webhook_ingress)
+
+class LocalSqs:
+    """Stands in for SQS: counts requests and messages, and sleeps to mimic request latency."""
+
+    def __init__(self, latency_seconds):
+        self.latency_seconds = latency_seconds
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.messages = 0
+        self.events = 0
+
+    def send_message_batch(self, QueueUrl, Entries):
+        time.sleep(self.latency_seconds)
+        with self.lock:
+            self.requests += 1
+            self.messages += len(Entries)
+            self.events += sum(len(json.loads(entry["MessageBody"])["events"]) for entry in Entries)
+        return {"Successful": [{"Id": entry["Id"]} for entry in Entries]}
+
+def send_webhook(url, index):
+    body = json.dumps({"Id": str(index % 10 + 1), "payload": f"data-{index}"}).encode("utf-8")
+    request = urllib.request.Request(url, data=body, headers={"Content-Type": "application/json"})
+    start = time.perf_counter()
+    with urllib.request.urlopen(request) as response:
+        response.read()
+    return time.perf_counter() - start
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+def run(buffer_ms, webhooks, concurrency, sqs_latency_ms, port):
+    webhook_ingress.MAX_BUFFER_SECONDS = buffer_ms / 1000
+    local_sqs = LocalSqs(sqs_latency_ms / 1000)
+    server = webhook_ingress.create_server(port=port, sqs_client=local_sqs)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    url = f"http://127.0.0.1:{port}/webhook"
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        latencies = list(executor.map(lambda index: send_webhook(url, index), range(webhooks)))
+    elapsed = time.perf_counter() - start
+
+    server.shutdown()
+    server.server_close()
+    webhook_ingress.WebhookHandler.batcher.stop()
+    return local_sqs, latencies, elapsed
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure SQS requests per 1,000 webhooks and the latency cost of buffering.")
+    parser.add_argument("--webhooks", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50, help="Concurrent webhook senders")
+    parser.add_argument("--sqs-latency-ms", type=float, default=15, help="Simulated SendMessageBatch latency")
+    parser.add_argument("--buffer-ms", type=float, nargs="+", default=[0, 10, 50, 100])
+    parser.add_argument("--port", type=int, default=18080)
+    args = parser.parse_args()
+
+    print(f"{args.webhooks} webhooks, {args.concurrency} concurrent senders, {args.sqs_latency_ms} ms SQS latency")
+    print("Without the ingress, API Gateway sends 1000 SendMessage requests per 1,000 webhooks "
+          "and consumers receive 1 event per message")
+    print(f"{'buffer ms':>10} {'req/1k':>8} {'events/msg':>11} {'p50 ms':>8} {'p99 ms':>8} {'webhooks/s':>11}")
+
+    for index, buffer_ms in enumerate(args.buffer_ms):
+        local_sqs, latencies, elapsed = run(buffer_ms, args.webhooks, args.concurrency, args.sqs_latency_ms, args.port + index)
+        print(f"{buffer_ms:>10g} {local_sqs.requests * 1000 / args.webhooks:>8.1f} "
+              f"{local_sqs.events / local_sqs.messages:>11.1f} "
+              f"{percentile(latencies, 0.5) * 1000:>8.1f} {percentile(latencies, 0.99) * 1000:>8.1f} "
+              f"{args.webhooks / elapsed:>11.0f}")
@@ -0,0 +1,236 @@
+import boto3
+import os
+import json
+import time
+import signal
+import threading
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Fetch the SQS queue URL from the environment
+queue_url = os.getenv("SQS_QUEUE_URL")
+if not queue_url:
+    raise ValueError("Environment variable SQS_QUEUE_URL is not set")
+
+PORT = int(os.getenv("PORT", 8080))
+# How long the first buffered event may wait for company before the batch is sent
+MAX_BUFFER_SECONDS = float(os.getenv("MAX_BUFFER_MS", 50)) / 1000
+MAX_EVENTS_PER_MESSAGE = int(os.getenv("MAX_EVENTS_PER_MESSAGE", 25))
+MAX_BATCH_BYTES = 256 * 1024  # SendMessageBatch payload limit
+MAX_MESSAGE_BYTES = min(int(os.getenv("MAX_MESSAGE_BYTES", 64 * 1024)), MAX_BATCH_BYTES)
+MAX_BATCH_MESSAGES = 10  # SendMessageBatch entry limit
+SENDER_THREADS = int(os.getenv("SENDER_THREADS", 2))
+# "sent": respond once the event is in SQS. "buffered": respond immediately, risking
+# the buffered events if the task dies
+ACK_MODE = os.getenv("ACK_MODE", "sent")
+
+ENVELOPE_TYPE = "webhook-batch"
+# Consumers only unpack messages carrying this attribute, never based on the body
+ENVELOPE_ATTRIBUTES = {"envelope": {"DataType": "String", "StringValue": ENVELOPE_TYPE}}
+# Bytes the envelope adds around the events; SQS counts attribute names, types and values too
+ENVELOPE_OVERHEAD = len(json.dumps({"envelope": ENVELOPE_TYPE, "events": []})) + sum(
+    len(name) + len(attribute["DataType"]) + len(attribute["StringValue"])
+    for name, attribute in ENVELOPE_ATTRIBUTES.items()
+)
+
+# Initialize SQS client
+sqs = boto3.client("sqs", region_name="us-east-1")
+
+class PendingEvent:
+    def __init__(self, body):
+        self.body = body
+        self.size = len(body.encode("utf-8")) + 2  # Plus the ", " separator
+        self.received_at = time.monotonic()
+        self.sent = threading.Event()
+        self.error = None
+
+class EventBatcher:
+    """
+    Buffers webhook events and sends them with SendMessageBatch, packing several
+    events into each message. A batch goes out once it is full or its oldest
+    event has waited MAX_BUFFER_SECONDS, whichever comes first.
+    """
+
+    def __init__(self, sqs_client, queue_url, sender_threads=SENDER_THREADS):
+        self.sqs = sqs_client
+        self.queue_url = queue_url
+        self.condition = threading.Condition()
+        self.pending = deque()
+        self.pending_bytes = 0
+        self.running = True
+        self.senders = [
+            threading.Thread(target=self._send_loop, daemon=True)
+            for _ in range(sender_threads)
+        ]
+        for sender in self.senders:
+            sender.start()
+
+    def submit(self, body):
+        event = PendingEvent(body)
+        if event.size + ENVELOPE_OVERHEAD > MAX_MESSAGE_BYTES:
+            raise ValueError(f"Event of {event.size} bytes exceeds MAX_MESSAGE_BYTES")
+
+        with self.condition:
+            self.pending.append(event)
+            self.pending_bytes += event.size
+            self.condition.notify()
+        return event
+
+    def stop(self):
+        """Flush whatever is buffered and stop the sender threads."""
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+        for sender in self.senders:
+            sender.join()
+
+    def _is_full(self):
+        max_events = MAX_EVENTS_PER_MESSAGE * MAX_BATCH_MESSAGES
+        return len(self.pending) >= max_events or self.pending_bytes >= MAX_BATCH_BYTES
+
+    def _take_batch(self):
+        """Wait for a batch to be due, then pack pending events into up to 10 messages."""
+        with self.condition:
+            while True:
+                if self.pending:
+                    wait_time = self.pending[0].received_at + MAX_BUFFER_SECONDS - time.monotonic()
+                    if self._is_full() or wait_time <= 0 or not self.running:
+                        break
+                    self.condition.wait(wait_time)
+                elif not self.running:
+                    return []
+                else:
+                    self.condition.wait()
+
+            messages, current, current_bytes, batch_bytes = [], [], ENVELOPE_OVERHEAD, 0
+            while self.pending:
+                event = self.pending[0]
+                if len(current) == MAX_EVENTS_PER_MESSAGE or current_bytes + event.size > MAX_MESSAGE_BYTES:
+                    messages.append(current)
+                    batch_bytes += current_bytes
+                    current, current_bytes = [], ENVELOPE_OVERHEAD
+                    if len(messages) == MAX_BATCH_MESSAGES:
+                        break
+                if batch_bytes + current_bytes + event.size > MAX_BATCH_BYTES:
+                    break
+                current.append(self.pending.popleft())
+                current_bytes += event.size
+                self.pending_bytes -= event.size
+            if current:
+                messages.append(current)
+
+            # Let another sender pick up whatever is left
+            if self.pending:
+                self.condition.notify()
+            return messages
+
+    def _send_loop(self):
+        while True:
+            messages = self._take_batch()
+            if not messages:
+                return
+            self._send(messages)
+
+    def _send(self, messages):
+        entries = {
+            str(index): events
+            for index, events in enumerate(messages)
+        }
+        for _ in range(2):
+            try:
+                response = self.sqs.send_message_batch(
+                    QueueUrl=self.queue_url,
+                    Entries=[
+                        {"Id": entry_id, "MessageBody": pack_events(events), "MessageAttributes": ENVELOPE_ATTRIBUTES}
+                        for entry_id, events in entries.items()
+                    ]
+                )
+            except Exception as e:
+                print(f"Error sending batch: {e}")
+                response = {"Failed": [{"Id": entry_id, "Message": str(e)} for entry_id in entries]}
+
+            for success in response.get("Successful", []):
+                for event in entries.pop(success["Id"]):
+                    event.sent.set()
+
+            if not entries:
+                return
+            # Retry the failed entries once before failing their requests
+            failures = {failure["Id"]: failure.get("Message", failure.get("Code")) for failure in response.get("Failed", [])}
+
+        for entry_id, events in entries.items():
+            for event in events:
+                event.error = failures.get(entry_id, "Not acknowledged by SQS")
+                event.sent.set()
+
+def pack_events(events):
+    """The envelope consumers unpack; each event keeps its original JSON body."""
+    return '{"envelope": "%s", "events": [%s]}' % (ENVELOPE_TYPE, ", ".join(event.body for event in events))
+
+class WebhookHandler(BaseHTTPRequestHandler):
+    batcher = None
+
+    def do_POST(self):
+        if self.path.rstrip("/") != "/webhook":
+            self._respond(404, {"message": "Not found"})
+            return
+
+        try:
+            content_length = int(self.headers.get("Content-Length", 0))
+        except ValueError:
+            self._respond(400, {"message": "Invalid Content-Length"})
+            return
+        # Refuse oversized events before reading them; the unread body leaves the connection unusable
+        if content_length + 2 + ENVELOPE_OVERHEAD > MAX_MESSAGE_BYTES:
+            self.close_connection = True
+            self._respond(413, {"message": f"Event of {content_length} bytes exceeds MAX_MESSAGE_BYTES"})
+            return
+
+        try:
+            body = self.rfile.read(content_length).decode("utf-8")
+            json.loads(body)
+            event = self.batcher.submit(body)
+        except ValueError as e:
+            self._respond(400, {"message": f"Invalid event: {e}"})
+            return
+
+        if ACK_MODE == "sent":
+            event.sent.wait()
+            if event.error:
+                self._respond(503, {"message": f"Failed to enqueue: {event.error}"})
+                return
+
+        self._respond(200, {"message": "Message successfully enqueued"})
+
+    def _respond(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Per-request access logs would dominate the output at webhook rates
+        pass
+
+class WebhookServer(ThreadingHTTPServer):
+    # The default listen backlog of 5 resets connections under bursts of webhooks
+    request_queue_size = 128
+
+def create_server(port=PORT, sqs_client=sqs):
+    WebhookHandler.batcher = EventBatcher(sqs_client, queue_url)
+    return WebhookServer(("0.0.0.0", port), WebhookHandler)
+
+if __name__ == "__main__":
+    server = create_server()
+
+    # ECS stops tasks with SIGTERM; stop accepting requests and flush the buffer
+    signal.signal(signal.SIGTERM, lambda signum, frame: threading.Thread(target=server.shutdown).start())
+
+    print(f"Starting webhook ingress on port {PORT} for queue: {queue_url}")
+    try:
+        server.serve_forever()
+    finally:
+        WebhookHandler.batcher.stop()
+        print("Webhook ingress stopped")
@@ -0,0 +1,71 @@
+import os
+from datetime import timedelta
+
+class DebouncePolicy:
+    """
+    Decides when an edited entity is due for processing.
+
+    An entity is due once it has been quiet (no new events) for quiet_seconds and it
+    hasn't been processed within the last reprocess_seconds. With only_if_changed, it
+    also needs an event newer than its last processing; without it, idle entities are
+    reprocessed every reprocess_seconds. The processor checks every poll_seconds.
+    """
+
+    def __init__(self, quiet_seconds=15, reprocess_seconds=60, poll_seconds=10, only_if_changed=False):
+        self.quiet_seconds = quiet_seconds
+        self.reprocess_seconds = reprocess_seconds
+        self.poll_seconds = poll_seconds
+        self.only_if_changed = only_if_changed
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            quiet_seconds=float(os.getenv("DEBOUNCE_QUIET_SECONDS", 15)),
+            reprocess_seconds=float(os.getenv("DEBOUNCE_REPROCESS_SECONDS", 60)),
+            poll_seconds=float(os.getenv("DEBOUNCE_POLL_SECONDS", 10)),
+            only_if_changed=os.getenv("DEBOUNCE_ONLY_IF_CHANGED", "false").lower() == "true"
+        )
+
+    def __repr__(self):
+        return (
+            f"DebouncePolicy(quiet_seconds={self.quiet_seconds}, reprocess_seconds={self.reprocess_seconds}, "
+            f"poll_seconds={self.poll_seconds}, only_if_changed={self.only_if_changed})"
+        )
+
+    def due_after(self, last_event_time, last_processed_time=None):
+        """
+        The time after which the entity is due if no further events arrive, or None if
+        it won't become due. Works with datetimes or with plain seconds.
+        """
+        if self.only_if_changed and last_processed_time is not None and last_event_time <= last_processed_time:
+            return None
+
+        due = last_event_time + self._duration(last_event_time, self.quiet_seconds)
+        if last_processed_time is not None:
+            due = max(due, last_processed_time + self._duration(last_processed_time, self.reprocess_seconds))
+        return due
+
+    def is_due(self, last_event_time, last_processed_time, now):
+        due = self.due_after(last_event_time, last_processed_time)
+        return due is not None and now > due
+
+    def scan_arguments(self, now):
+        """DynamoDB Scan arguments selecting the entities that are due at now."""
+        filter_expression = (
+            "LastEventTime < :debounce AND "
+            "(attribute_not_exists(LastProcessedTime) OR LastProcessedTime < :continuous)"
+        )
+        if self.only_if_changed:
+            filter_expression += " AND (attribute_not_exists(LastProcessedTime) OR LastEventTime > LastProcessedTime)"
+
+        return {
+            "FilterExpression": filter_expression,
+            "ExpressionAttributeValues": {
+                ":debounce": (now - timedelta(seconds=self.quiet_seconds)).isoformat(),
+                ":continuous": (now - timedelta(seconds=self.reprocess_seconds)).isoformat()
+            }
+        }
+
+    @staticmethod
+    def _duration(reference, seconds):
+        return seconds if isinstance(reference, (int, float)) else timedelta(seconds=seconds)
@@ -1,7 +1,8 @@
 import boto3
 import os
 import time
-from datetime import datetime, timedelta
+from datetime import datetime
+from debounce_policy import DebouncePolicy
 
 dynamodb = boto3.resource("dynamodb")
 table_name = os.getenv("DYNAMODB_TABLE_NAME")
@@ -9,24 +10,15 @@ table = dynamodb.Table(table_name)
 
 cloudwatch = boto3.client("cloudwatch", region_name="us-east-1")
 
+policy = DebouncePolicy.from_env()
+
 def process_records():
     print(f"Scanning for entities to process")
 
     now = datetime.utcnow()
-    debounce_cutoff = now - timedelta(seconds=15)
-    continuous_cutoff = now - timedelta(minutes=1)
 
     # Scan for items that meet the debounce or continuous processing thresholds
-    response = table.scan(
-        FilterExpression=(
-            "LastEventTime < :debounce AND "
-            "(attribute_not_exists(LastProcessedTime) OR LastProcessedTime < :continuous)"
-        ),
-        ExpressionAttributeValues={
-            ":debounce": debounce_cutoff.isoformat(),
-            ":continuous": continuous_cutoff.isoformat()
-        }
-    )
+    response = table.scan(**policy.scan_arguments(now))
 
     for item in response.get("Items", []):
         entity_id = item["EntityId"]
@@ -60,8 +52,19 @@ def publish_metric(metric_name, value):
     except Exception as e:
         print(f"Failed to publish metric {metric_name}: {e}")
 
+def start_profiler():
+    """
+    Start the opt-in sampling profiler. It's imported only when enabled, since only
+    images built by deploy_image.sh include it.
+    """
+    if os.getenv("PROFILER_ENABLED", "false").lower() != "true":
+        return None
+    import sampling_profiler
+    return sampling_profiler.start_from_env()
+
 if __name__ == "__main__":
-    print(f"Starting entity change processor")
+    print(f"Starting entity change processor with {policy}")
+    start_profiler()
     while True:
         process_records()
-        time.sleep(10)  # Poll every 10 seconds
\ No newline at end of file
+        time.sleep(policy.poll_seconds)
\ No newline at end of file
@@ -29,6 +29,7 @@ def process_messages():
             response = sqs.receive_message(
                 QueueUrl=queue_url,
                 MaxNumberOfMessages=10,
+                MessageAttributeNames=["envelope"],
                 WaitTimeSeconds=20  # Long polling
             )
 
@@ -36,8 +37,8 @@ def process_messages():
                 for message in response["Messages"]:
                     print(f"Processing message: {message['Body']}")
 
-                    handle_message(message["Body"])
-                    publish_metric("WebhookEventsCount", 1)
+                    event_count = handle_message(message["Body"], message.get("MessageAttributes"))
+                    publish_metric("WebhookEventsCount", event_count)
                     cleanup_message(message["ReceiptHandle"])
 
                     print(f"Message processed: {message['MessageId']}")
@@ -48,29 +49,56 @@ def process_messages():
             print(f"Error processing messages: {e}")
             time.sleep(5)  # Pause briefly before retrying
 
-def handle_message(message_body):
+def handle_message(message_body, message_attributes=None):
     """
     Process the message and store/update it in DynamoDB.
+    Returns the number of webhook events the message carried.
     """
     try:
-        message = json.loads(message_body)
-        entity_id = message.get("Id")
+        events = unpack_events(message_body, message_attributes)
+    except Exception as e:
+        print(f"Error handling message: {e}")
+        return 1
+
+    # Events for the same entity in one batch only need one LastEventTime write
+    entity_ids = []
+    for event in events:
+        entity_id = event.get("Id") if isinstance(event, dict) else None
         if not entity_id:
-            raise ValueError("Message does not contain 'Id'")
+            print(f"Error handling event: Event does not contain 'Id': {event}")
+        elif entity_id not in entity_ids:
+            entity_ids.append(entity_id)
 
-        current_time = datetime.utcnow().isoformat()
+    for entity_id in entity_ids:
+        try:
+            current_time = datetime.utcnow().isoformat()
 
-        dynamodb.put_item(
-            TableName=dynamodb_table_name,
-            Item={
-                "EntityId": {"S": entity_id},
-                "LastEventTime": {"S": current_time}
-            }
-        )
-        print(f"Stored EntityId: {entity_id} with timestamp: {current_time}")
+            dynamodb.put_item(
+                TableName=dynamodb_table_name,
+                Item={
+                    "EntityId": {"S": entity_id},
+                    "LastEventTime": {"S": current_time}
+                }
+            )
+            print(f"Stored EntityId: {entity_id} with timestamp: {current_time}")
 
-    except Exception as e:
-        print(f"Error handling message: {e}")
+        except Exception as e:
+            print(f"Error handling message: {e}")
+
+    return len(events)
+
+def unpack_events(message_body, message_attributes=None):
+    """
+    Messages from the batching ingress wrap several events in an envelope and are
+    marked with an "envelope" attribute, while API Gateway enqueues each webhook
+    body as its own message. A webhook body that happens to look like an envelope
+    is left alone, since only the ingress sets the attribute.
+    """
+    message = json.loads(message_body)
+    envelope = (message_attributes or {}).get("envelope", {}).get("StringValue")
+    if envelope == "webhook-batch":
+        return message["events"]
+    return [message]
 
 def cleanup_message(receiptHandle):
     sqs.delete_message(
@@ -96,5 +124,16 @@ def publish_metric(metric_name, value):
     except Exception as e:
         print(f"Failed to publish metric {metric_name}: {e}")
 
+def start_profiler():
+    """
+    Start the opt-in sampling profiler. It's imported only when enabled, since only
+    images built by deploy_image.sh include it.
+    """
+    if os.getenv("PROFILER_ENABLED", "false").lower() != "true":
+        return None
+    import sampling_profiler
+    return sampling_profiler.start_from_env()
+
 if __name__ == "__main__":
+    start_profiler()
     process_messages()
\ No newline at end of file
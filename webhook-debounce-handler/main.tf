@@ -414,6 +414,22 @@ resource "aws_ecs_task_definition" "entity_change_processor_task_definition" {
         {
           name  = "DYNAMODB_TABLE_NAME",
           value = aws_dynamodb_table.entity_event_table.name
+        },
+        {
+          name  = "DEBOUNCE_QUIET_SECONDS",
+          value = "15"
+        },
+        {
+          name  = "DEBOUNCE_REPROCESS_SECONDS",
+          value = "60"
+        },
+        {
+          name  = "DEBOUNCE_POLL_SECONDS",
+          value = "10"
+        },
+        {
+          name  = "DEBOUNCE_ONLY_IF_CHANGED",
+          value = "false"
         }
       ],
       logConfiguration = {
@@ -0,0 +1,237 @@
+import argparse
+import csv
+import itertools
+import json
+import multiprocessing
+import os
+import random
+import re
+import sys
+import time
+from bisect import bisect_right
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "ecs-tasks", "entity-change-processor"))
+from debounce_policy import DebouncePolicy
+
+# Approximate size of an EntityEventTable item (EntityId, LastEventTime, LastProcessedTime)
+ITEM_BYTES = 100
+
+# Set before the sweep forks its workers, so the trace isn't pickled per policy
+TRACE = None
+
+LOG_LINE = re.compile(r"Stored EntityId: (?P<entity_id>\S+) with timestamp: (?P<timestamp>\S+)")
+
+def parse_timestamp(value):
+    try:
+        return float(value)
+    except ValueError:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        return parsed.timestamp()
+
+def load_trace(path):
+    """
+    Read (timestamp, entity_id) events from JSON lines ({"timestamp": ..., "Id": ...}),
+    CSV (timestamp,entity_id) or the event handler's "Stored EntityId" log lines.
+    """
+    events = []
+    with open(path) as trace_file:
+        for line in trace_file:
+            line = line.strip()
+            if not line:
+                continue
+            match = LOG_LINE.search(line)
+            if match:
+                events.append((parse_timestamp(match["timestamp"]), match["entity_id"]))
+            elif line.startswith("{"):
+                record = json.loads(line)
+                entity_id = record.get("entity_id", record.get("EntityId", record.get("Id")))
+                events.append((parse_timestamp(str(record["timestamp"])), str(entity_id)))
+            else:
+                row = next(csv.reader([line]))
+                try:
+                    events.append((parse_timestamp(row[0]), row[1]))
+                except ValueError:
+                    continue  # Header row
+    return events
+
+def generate_uniform_trace(events, entities, duration, seed):
+    """Like send-many-events.sh: random entity IDs from 1..entities, spread evenly over the duration."""
+    rng = random.Random(seed)
+    return [(rng.uniform(0, duration), str(rng.randint(1, entities))) for _ in range(events)]
+
+def generate_bursty_trace(events, entities, duration, burst_size, burst_spread, seed):
+    """Bursts of roughly burst_size events for one entity within burst_spread seconds."""
+    rng = random.Random(seed)
+    trace = []
+    while len(trace) < events:
+        entity_id = str(rng.randint(1, entities))
+        start = rng.uniform(0, duration)
+        for _ in range(max(1, int(rng.expovariate(1 / burst_size)))):
+            trace.append((start + rng.uniform(0, burst_spread), entity_id))
+    return trace[:events]
+
+def group_by_entity(events):
+    """Sorted event times per entity, relative to the first event."""
+    start = min(timestamp for timestamp, _ in events)
+    by_entity = {}
+    for timestamp, entity_id in events:
+        by_entity.setdefault(entity_id, []).append(timestamp - start)
+    return [sorted(times) for times in by_entity.values()]
+
+def percentile(ordered, fraction):
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+def simulate(policy, entity_events=None, end=None):
+    """
+    Replay the trace through a policy. Polls happen every poll_seconds from the first
+    event; each entity is jumped straight to its next due poll rather than checked at
+    every poll, which keeps a sweep over millions of events fast.
+    """
+    entity_events = entity_events if entity_events is not None else TRACE["entities"]
+    end = end if end is not None else TRACE["end"]
+    poll = policy.poll_seconds
+
+    def next_poll(after):
+        return (int(after // poll) + 1) * poll
+
+    processings = redundant = unprocessed = 0
+    latencies = []
+    for events in entity_events:
+        count = len(events)
+        seen = 0  # Events visible to the processor so far
+        covered = 0  # Events reflected by a processing so far
+        last_processed = None
+        while True:
+            if seen == 0 or policy.due_after(events[seen - 1], last_processed) is None:
+                if seen == count:
+                    break
+                seen += 1  # Nothing is due until the next event arrives
+                continue
+
+            poll_time = next_poll(policy.due_after(events[seen - 1], last_processed))
+            if poll_time > end:
+                break
+            newer = bisect_right(events, poll_time, seen)
+            if newer > seen:
+                seen = newer  # More events arrived before the poll, which may push it back
+                continue
+
+            processings += 1
+            if covered == seen:
+                redundant += 1
+            latencies.extend([poll_time - event_time for event_time in events[covered:seen]])
+            covered = seen
+            last_processed = poll_time
+
+            if seen == count and not policy.only_if_changed:
+                # No more events, so the entity is reprocessed at a fixed stride until the end
+                stride = next_poll(last_processed + policy.reprocess_seconds) - last_processed
+                repeats = int((end - last_processed) // stride)
+                processings += repeats
+                redundant += repeats
+                break
+        unprocessed += count - covered
+
+    # Every poll scans the whole table; eventually consistent reads cost 0.5 RCU per 4 KB
+    first_events = sorted(events[0] for events in entity_events)
+    read_units = 0.0
+    for poll_index in range(int(end // poll) + 1):
+        items = bisect_right(first_events, poll_index * poll)
+        read_units += 0.5 * max(1, -(-items * ITEM_BYTES // 4096))
+
+    event_count = sum(len(events) for events in entity_events)
+    latencies.sort()
+    return {
+        "quiet_seconds": policy.quiet_seconds,
+        "reprocess_seconds": policy.reprocess_seconds,
+        "poll_seconds": policy.poll_seconds,
+        "only_if_changed": policy.only_if_changed,
+        "processings": processings,
+        "redundant_processings": redundant,
+        # Processings per changed entity; one each is the minimum to end up consistent
+        "write_amplification": processings / len(entity_events),
+        # One PutItem per event from the event handler plus one UpdateItem per processing
+        "write_units": event_count + processings,
+        "read_units": read_units,
+        "latency_p50": percentile(latencies, 0.5),
+        "latency_p90": percentile(latencies, 0.9),
+        "latency_p99": percentile(latencies, 0.99),
+        "latency_max": latencies[-1] if latencies else None,
+        "unprocessed_events": unprocessed
+    }
+
+def format_seconds(value):
+    return "-" if value is None else f"{value:.1f}"
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay webhook event traces through candidate debounce policies.")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--trace", help="JSON lines, CSV or event handler log export to replay")
+    source.add_argument("--synthetic", choices=["uniform", "bursty"], default="bursty",
+                        help="Generate a trace instead (default: bursty)")
+    parser.add_argument("--events", type=int, default=100000)
+    parser.add_argument("--entities", type=int, default=1000)
+    parser.add_argument("--duration", type=float, default=3600, help="Synthetic trace length in seconds")
+    parser.add_argument("--burst-size", type=float, default=8, help="Mean events per burst")
+    parser.add_argument("--burst-spread", type=float, default=20, help="Seconds a burst is spread over")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--tail", type=float, default=300, help="Seconds simulated after the last event")
+    parser.add_argument("--quiet", type=float, nargs="+", default=[15], help="Quiet periods to try")
+    parser.add_argument("--reprocess", type=float, nargs="+", default=[60], help="Reprocess intervals to try")
+    parser.add_argument("--poll", type=float, nargs="+", default=[10], help="Poll intervals to try")
+    parser.add_argument("--only-if-changed", choices=["false", "true", "both"], default="false")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--csv", help="Also write the results to this CSV file")
+    args = parser.parse_args()
+
+    load_start = time.perf_counter()
+    if args.trace:
+        events = load_trace(args.trace)
+    elif args.synthetic == "uniform":
+        events = generate_uniform_trace(args.events, args.entities, args.duration, args.seed)
+    else:
+        events = generate_bursty_trace(args.events, args.entities, args.duration, args.burst_size, args.burst_spread, args.seed)
+
+    entity_events = group_by_entity(events)
+    TRACE = {
+        "entities": entity_events,
+        "end": max(times[-1] for times in entity_events) + args.tail
+    }
+    print(f"Loaded {len(events)} events for {len(entity_events)} entities in {time.perf_counter() - load_start:.1f}s")
+
+    only_if_changed = {"false": [False], "true": [True], "both": [False, True]}[args.only_if_changed]
+    policies = [
+        DebouncePolicy(quiet, reprocess, poll, changed)
+        for quiet, reprocess, poll, changed in itertools.product(args.quiet, args.reprocess, args.poll, only_if_changed)
+    ]
+
+    sweep_start = time.perf_counter()
+    if args.workers > 1 and len(policies) > 1:
+        with ProcessPoolExecutor(max_workers=args.workers, mp_context=multiprocessing.get_context("fork")) as executor:
+            results = list(executor.map(simulate, policies))
+    else:
+        results = [simulate(policy) for policy in policies]
+    print(f"Simulated {len(policies)} policies in {time.perf_counter() - sweep_start:.1f}s")
+
+    print(f"{'quiet':>6} {'reproc':>6} {'poll':>5} {'changed':>7} {'processed':>10} {'redundant':>10} "
+          f"{'amp':>6} {'WCU':>10} {'RCU':>10} {'p50':>6} {'p90':>6} {'p99':>6} {'max':>6} {'pending':>8}")
+    for result in results:
+        print(f"{result['quiet_seconds']:>6g} {result['reprocess_seconds']:>6g} {result['poll_seconds']:>5g} "
+              f"{str(result['only_if_changed']):>7} {result['processings']:>10} {result['redundant_processings']:>10} "
+              f"{result['write_amplification']:>6.2f} {result['write_units']:>10} {result['read_units']:>10.0f} "
+              f"{format_seconds(result['latency_p50']):>6} {format_seconds(result['latency_p90']):>6} "
+              f"{format_seconds(result['latency_p99']):>6} {format_seconds(result['latency_max']):>6} "
+              f"{result['unprocessed_events']:>8}")
+
+    if args.csv:
+        with open(args.csv, "w", newline="") as csv_file:
+            writer = csv.DictWriter(csv_file, fieldnames=list(results[0]))
+            writer.writeheader()
+            writer.writerows(results)
+        print(f"Wrote {args.csv}")
@@ -0,0 +1,111 @@
+import argparse
+import importlib.util
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+os.environ.setdefault("SQS_QUEUE_URL", "https://sqs.us-east-1.amazonaws.com/000000000000/benchmark")
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+
+sys.path.append(str(Path(__file__).parents[1] / "tools"))
+import sampling_profiler
+
+# event-handler.py isn't importable by name because of the hyphen
+spec = importlib.util.spec_from_file_location("event_handler", Path(__file__).parent / "ecs-tasks" / "event-handler.py")
+event_handler = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(event_handler)
+
+def make_message(index, events_per_message):
+    events = [
+        {"Id": str((index + offset) % 100 + 1), "payload": f"data-{index}-{offset}", "fields": {"count": offset, "tags": ["a", "b"]}}
+        for offset in range(events_per_message)
+    ]
+    return json.dumps({"envelope": "webhook-batch", "events": events})
+
+# What the batching ingress sets on every enveloped message
+ENVELOPE_ATTRIBUTES = {"envelope": {"DataType": "String", "StringValue": "webhook-batch"}}
+
+def handle(message_body):
+    """Stands in for handle_message without the per-event print."""
+    total = 0
+    for event in event_handler.unpack_events(message_body, ENVELOPE_ATTRIBUTES):
+        record = json.loads(event)
+        total += len(json.dumps({"EntityId": record["Id"], "Payload": record["payload"], "Fields": record["fields"]}))
+    return total
+
+def worker(messages, stop, counts, index):
+    handled = 0
+    while not stop.is_set():
+        for message in messages:
+            handle(message)
+        handled += len(messages)
+    counts[index] = handled
+
+def idle_poller(stop):
+    # Like a thread blocked in SQS long polling
+    while not stop.is_set():
+        stop.wait(20)
+
+def run(seconds, threads, messages, profiler):
+    stop = threading.Event()
+    counts = [0] * threads
+    workers = [threading.Thread(target=worker, args=(messages, stop, counts, index)) for index in range(threads)]
+    workers.append(threading.Thread(target=idle_poller, args=(stop,)))
+    if profiler:
+        profiler.start()
+
+    start = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    if profiler:
+        profiler.stop()
+    return sum(counts) / elapsed
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure event handler throughput with the sampling profiler on and off.")
+    parser.add_argument("--seconds", type=float, default=5, help="Length of each run")
+    parser.add_argument("--rounds", type=int, default=5, help="Runs per configuration, interleaved")
+    parser.add_argument("--threads", type=int, default=2, help="Busy handler threads")
+    parser.add_argument("--events-per-message", type=int, default=10)
+    parser.add_argument("--interval-ms", type=float, nargs="+", default=[10, 1])
+    parser.add_argument("--max-overhead", type=float, default=0.01)
+    parser.add_argument("--mode", choices=["cpu", "wall"], default="cpu")
+    args = parser.parse_args()
+
+    messages = [make_message(index, args.events_per_message) for index in range(100)]
+    output_dir = tempfile.mkdtemp()
+    configurations = [("off", None)] + [(f"{interval_ms:g} ms", interval_ms) for interval_ms in args.interval_ms]
+    results = {label: [] for label, _ in configurations}
+    try:
+        for _ in range(args.rounds):
+            for label, interval_ms in configurations:
+                profiler = None
+                if interval_ms is not None:
+                    profiler = sampling_profiler.SamplingProfiler(
+                        output_dir, interval_seconds=interval_ms / 1000, window_seconds=3600,
+                        max_overhead=args.max_overhead, mode=args.mode
+                    )
+                results[label].append(run(args.seconds, args.threads, messages, profiler))
+    finally:
+        shutil.rmtree(output_dir)
+
+    baseline = statistics.median(results["off"])
+    print(f"{args.threads} busy threads + 1 idle thread, {args.rounds} x {args.seconds:g}s runs each, "
+          f"{args.mode} mode, max overhead {args.max_overhead:.0%}")
+    print(f"{'profiler':>10} {'msgs/s (median)':>16} {'min':>10} {'max':>10} {'overhead':>9}")
+    for label, _ in configurations:
+        median = statistics.median(results[label])
+        print(f"{label:>10} {median:>16.0f} {min(results[label]):>10.0f} {max(results[label]):>10.0f} "
+              f"{(baseline - median) / baseline:>8.1%}")
@@ -16,7 +16,8 @@ echo "### Step 1: Authenticate Docker to ECR ###"
 aws ecr get-login-password --region "${AWS_REGION}" | docker login --username AWS --password-stdin "${AWS_ACCOUNT_ID}.dkr.ecr.${AWS_REGION}.amazonaws.com"
 
 echo "### Step 2: Build the Docker image ###"
-docker build -t "${ECR_REPO_NAME}" .
+# The shared sampling profiler lives in the repo's tools directory
+docker build -t "${ECR_REPO_NAME}" --build-context tools=../../tools .
 
 echo "### Step 3: Tag the Docker image ###"
 docker tag "${ECR_REPO_NAME}:latest" "${ECR_REPO_URI}"
@@ -1,6 +1,7 @@
 import boto3
 import os
 import time
+import json
 
 # Fetch the SQS queue URL from the environment
 queue_url = os.getenv("SQS_QUEUE_URL")
@@ -21,6 +22,7 @@ def process_messages():
             response = sqs.receive_message(
                 QueueUrl=queue_url,
                 MaxNumberOfMessages=10,
+                MessageAttributeNames=["envelope"],
                 WaitTimeSeconds=20  # Long polling
             )
 
@@ -30,7 +32,7 @@ def process_messages():
 
                     # Process the message (custom logic goes here)
                     # Example: Print the message body
-                    handle_message(message["Body"])
+                    handle_message(message["Body"], message.get("MessageAttributes"))
 
                     # Delete the message from the queue after processing
                     sqs.delete_message(
@@ -45,12 +47,36 @@ def process_messages():
             print(f"Error processing messages: {e}")
             time.sleep(5)  # Pause briefly before retrying
 
-def handle_message(message_body):
+def handle_message(message_body, message_attributes=None):
     """
     Placeholder for custom message processing logic.
     Replace this function with your business logic.
     """
-    print(f"Handling message: {message_body}")
+    for event in unpack_events(message_body, message_attributes):
+        print(f"Handling event: {event}")
+
+def unpack_events(message_body, message_attributes=None):
+    """
+    Messages from the batching ingress wrap several events in an envelope and are
+    marked with an "envelope" attribute, while API Gateway enqueues each webhook
+    body as its own message. A webhook body that happens to look like an envelope
+    is left alone, since only the ingress sets the attribute.
+    """
+    envelope = (message_attributes or {}).get("envelope", {}).get("StringValue")
+    if envelope != "webhook-batch":
+        return [message_body]
+    return [json.dumps(event) for event in json.loads(message_body)["events"]]
+
+def start_profiler():
+    """
+    Start the opt-in sampling profiler. It's imported only when enabled, since only
+    images built by deploy_image.sh include it.
+    """
+    if os.getenv("PROFILER_ENABLED", "false").lower() != "true":
+        return None
+    import sampling_profiler
+    return sampling_profiler.start_from_env()
 
 if __name__ == "__main__":
+    start_profiler()
     process_messages()
\ No newline at end of file